@@ -1,24 +1,19 @@
 from api.wiki_service import WikiService
 from api.wiki_http import WikiHttp
+from api.response_cache import ResponseCache
 from repository.db_setup import Repository
-from constants import DB_PATH
+from constants import DB_PATH, HTTP_CACHE_PATH, HTTP_CACHE_TTL
 import pathlib
 
 
 def demo_setup():
 
-    service = WikiService(wiki_http=WikiHttp(), repo=Repository(DB_PATH))
+    service = WikiService(wiki_http=WikiHttp(cache=ResponseCache(HTTP_CACHE_PATH, ttl=HTTP_CACHE_TTL)),
+                          repo=Repository(DB_PATH))
 
+    # The file is streamed line by line through the ingest pipeline.
     with open(pathlib.Path(__file__).parent / 'test_cases/words', 'r') as file:
-        words = file.read().split('\n')
-    print(words[15:])
-
-    demo = service.check_database(words)
-    if len(demo) > 15:
-        service.get_meanings_from_wiki(demo[0:15])
-        service.get_meanings_from_wiki(demo[15:])
-    else:
-        service.get_meanings_from_wiki(demo)
+        service.ingest(file)
 
 
 if __name__ == '__main__':
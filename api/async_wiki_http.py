@@ -0,0 +1,163 @@
+#!api/async_wiki_http.py Python3
+"""
+This module contains AsyncWikiHttp class, the asyncio counterpart of WikiHttp.
+The request parameters, URL and the shape of the returned JSON are the same as in api/wiki_http.py,
+so the result can be passed to ResponseParser as it is.
+
+The only difference is that all chunks of words are requested on one event loop instead of a thread pool,
+and the number of requests in flight is limited by 'max_in_flight'.
+AsyncWikiHttp requires aiohttp (pip install aiohttp).
+
+Example:
+    async with AsyncWikiHttp(max_in_flight=32) as http:
+        js = await http.get(['Python Programming', 'This is missing', '[]This[]is[]invalid[]', 'Python'])
+"""
+import asyncio
+import json
+from api.wiki_http import WikiHttp, WikiHttpError, WikiHttpRetryError
+from api.rate_limiter import RateLimiter
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncWikiHttp:
+    """AsyncWikiHttp requests a JSON from MediaWiki based on words provided, asynchronously.
+    Args:
+        chunk_size: number of titles sent in one request, default=50 (see WikiHttp)
+        max_in_flight: number of requests run concurrently on the event loop, default=16
+        rate_limiter: RateLimiter object that paces requests, default=RateLimiter()
+        max_retries: number of retries of a throttled or failed request, default=5
+        url: URL of MediaWiki api.php, default=WikiHttp._URL (English Wikipedia)
+    """
+
+    def __init__(self, chunk_size=50, max_in_flight=16, rate_limiter=None, max_retries=5, url=None):
+        if aiohttp is None:
+            raise ImportError('AsyncWikiHttp requires aiohttp. Install it with: pip install aiohttp')
+
+        self.chunk_size = min(chunk_size, WikiHttp._TITLES_LIMIT)
+        self.max_in_flight = max_in_flight
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.url = url or WikiHttp._URL
+        self.session = None
+        self._loop = None
+
+    async def __aenter__(self):
+        self.session = self._new_session()
+        self._loop = asyncio.get_running_loop()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self) -> None:
+        """Close the session and all its pooled connections."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+            self._loop = None
+
+    def _new_session(self):
+        connector = aiohttp.TCPConnector(limit_per_host=self.max_in_flight)
+        return aiohttp.ClientSession(connector=connector, headers=WikiHttp._HEADERS,
+                                     timeout=aiohttp.ClientTimeout(total=15))
+
+    async def get(self, words):
+        """
+        Do request get from MediaWiki. Words are split into chunks of 'chunk_size' titles, at most
+        'max_in_flight' chunks are requested at the same time. All responses are merged into one JSON.
+        Args:
+                words: list or str of words
+        Returns:
+            dict: JSON serialization
+        """
+        words = words if type(words) == list else [words]
+        chunks = [words[i:i + self.chunk_size] for i in range(0, len(words), self.chunk_size)]
+
+        # A session is bound to the event loop it was opened on.
+        if self.session is not None and self._loop is asyncio.get_running_loop():
+            return await self._get_chunks(self.session, chunks)
+
+        # Not used as a context manager (or called from another loop): the session lives only for this call.
+        async with self._new_session() as session:
+            return await self._get_chunks(session, chunks)
+
+    async def _get_chunks(self, session, chunks: list) -> dict:
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async def get_chunk(words):
+            async with semaphore:
+                return await self._get_chunk_bisect(session, words)
+
+        return WikiHttp._merge(await asyncio.gather(*(get_chunk(chunk) for chunk in chunks)))
+
+    async def _get_chunk_bisect(self, session, words: list) -> dict:
+        """Request a chunk of words and split it in half if MediaWiki rejects it (see WikiHttp._get_chunk_bisect)."""
+        try:
+            return await self._get_chunk(session, words)
+        except WikiHttpRetryError as e:
+            return WikiHttp._failed_pages(words, e)
+        except WikiHttpError as e:
+            if len(words) == 1:
+                return WikiHttp._failed_page(words[0], e)
+
+            middle = len(words) // 2
+            return WikiHttp._merge([await self._get_chunk_bisect(session, words[:middle]),
+                                    await self._get_chunk_bisect(session, words[middle:])])
+
+    async def _get_chunk(self, session, words: list) -> dict:
+        """Request a single chunk of words from MediaWiki and follow its continuation (see WikiHttp._get_chunk)."""
+        # aiohttp does not serialize booleans, MediaWiki treats any value of a boolean parameter as true.
+        params = {key: str(value) for key, value in WikiHttp._PARAMS.items()}
+        params['titles'] = '|'.join(words)
+        js = await self._request(session, params)
+
+        while 'continue' in js:
+            params.update({key: str(value) for key, value in js['continue'].items()})
+            js = WikiHttp._merge_continued(js, await self._request(session, params))
+
+        return js
+
+    async def _request(self, session, params: dict) -> dict:
+        """Send one request paced by rate_limiter and retry it the same way as WikiHttp._request."""
+        error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(RateLimiter.backoff(attempt))
+            await asyncio.sleep(self.rate_limiter.reserve())
+
+            try:
+                async with session.get(self.url, params=params) as response:
+                    js = json.loads(await response.read()) if response.status == 200 else dict()
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                error = e
+                self.rate_limiter.throttle()
+                continue
+
+            retry_after = WikiHttp._retry_after(response.status, response.headers, js)
+            if retry_after is not None:
+                error = 'HTTP {}: {}'.format(response.status, js.get('error', response.reason))
+                self.rate_limiter.throttle(retry_after)
+                continue
+
+            if response.status != 200 or 'error' in js:
+                raise WikiHttpError('HTTP {}: {}'.format(response.status, js.get('error', response.reason)))
+
+            self.rate_limiter.success()
+            return js
+
+        raise WikiHttpRetryError('Request failed after {} retries: {}'.format(self.max_retries, error))
+
+
+if __name__ == '__main__':
+
+    async def main():
+        async with AsyncWikiHttp() as http:
+            res = await http.get(['Python Programming', 'This is missing', '[]This[]is[]invalid[]', 'Python'])
+            print(json.dumps(res, indent=4, sort_keys=True))
+
+    asyncio.run(main())
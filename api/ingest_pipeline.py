@@ -0,0 +1,351 @@
+#!api/ingest_pipeline.py Python3
+"""
+This module contains IngestPipeline, the streaming bulk import of words behind WikiService.ingest.
+
+Words flow through 5 stages connected by bounded queues:
+    1. normalize - words are read from the iterable, normalized and grouped into batches of unique titles
+                   (reader thread)
+    2. check     - titles that are already in the database (or their aliases) or remembered as failed are dropped
+                   (calling thread)
+    3. fetch     - batches are requested from MediaWiki by WikiHttp, chunk by chunk (fetcher threads)
+    4. parse     - every received chunk is parsed into a ResponseBatch (fetcher threads)
+    5. write     - successful responses of the chunk are saved by Repository.insert_many with their aliases,
+                   missing, invalid and disambiguation ones by Repository.insert_failed (calling thread, the rows
+                   are committed by the writer thread of the database, see repository/group_writer.py)
+
+Every queue holds at most 'queue_size' items, so a fast stage waits for a slow one (backpressure) and memory does
+not depend on the number of words: a words file of any size is read line by line and only a few batches are held
+at once. Fetching and writing overlap: chunks are written while the next ones are still being requested.
+
+The database stages (check and write) run on the calling thread. It alternates between them and writes parsed
+chunks whenever it would wait, so the fetchers never stall. Writes are submitted without waiting for their commit
+(wait=False), the writer thread commits them in groups. The calling thread only waits for them once a batch is
+complete, to know how many rows were written before the batch is recorded in the journal.
+
+Journal: if a job name is given, every batch whose responses were saved is appended to tbl_ingest_journal
+together with its outcome (see Repository.record_batch). When the job is resumed with the same words and
+batch_size, the recorded batches are skipped before the check stage, so neither the successful nor the failed
+words of an interrupted import are requested again. Only the batches that were in flight when it stopped
+are repeated. A batch with words that could not be requested (FailedRequestResponse, e.g. MediaWiki was unavailable)
+is not recorded: a resumed job takes it again, its saved words are dropped by the check stage and only the failed
+ones are requested. Such batches are counted in stats['unrecorded'].
+
+Words are deduplicated within a batch. A word repeated in a later batch is dropped by the check stage
+once its batch was written, a word repeated in a batch that is still being fetched is requested again.
+
+Example:
+    with open('words') as file:
+        stats = service.ingest(file, progress=lambda stats, batch: print(stats['written']))
+
+    with open('words') as file:
+        stats = service.ingest(file, job='words', resume=True)   # continues an interrupted import of 'words'
+"""
+import queue
+import threading
+import time
+from api.normalization import normalize_title
+from api.response import ResponseBatch, SuccessfulResponse, FailedRequestResponse
+
+
+class StageCounter:
+    """Throughput counter of a pipeline stage: items processed and seconds spent processing them."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '{}({}: {} items, {:.2f}s, {:.0f}/s)'.format(self.__class__.__name__, self.name, self.items,
+                                                            self.seconds, self.per_second)
+
+    @property
+    def per_second(self) -> float:
+        """Items per second of busy time of the stage (of all its threads together)."""
+        return self.items / self.seconds if self.seconds else 0.0
+
+    def add(self, items: int, seconds: float) -> None:
+        with self._lock:
+            self.items += items
+            self.seconds += seconds
+
+
+class IngestPipeline:
+    """Streaming pipeline: normalize -> check database -> fetch -> parse -> write.
+    Args:
+        service: WikiService object, its wiki_http and repo are used
+        batch_size: number of unique titles checked and requested together, default=500
+        fetchers: number of batches requested concurrently (every batch is split into chunks by WikiHttp), default=2
+        queue_size: number of items a queue between two stages holds, default=4
+        progress: callable(stats, batch) called after every written chunk with the statistics so far and
+            the ResponseBatch of the chunk ('written' is counted once the batch of the chunk is committed),
+            default=None
+        job: str, name of the job in the ingest journal, None means no journal, default=None
+        resume: bool, continue the job if it exists in the journal, default=False
+    Raises:
+        ValueError: the job exists and resume is False, or it was started with another batch_size
+    """
+
+    _DONE = object()
+    _POLL = 0.05
+
+    def __init__(self, service, batch_size=500, fetchers=2, queue_size=4, progress=None, job=None, resume=False):
+        self.service = service
+        self.batch_size = batch_size
+        self.fetchers = max(1, fetchers)
+        self.queue_size = queue_size
+        self.progress = progress
+        self.job = job
+        self.resume = resume
+
+        self.stages = {name: StageCounter(name) for name in ('normalize', 'check', 'fetch', 'parse', 'write')}
+        self.stats = {'words': 0, 'titles': 0, 'known': 0, 'requested': 0, 'succeed': 0, 'failed': 0,
+                      'written': 0, 'batches': 0, 'resumed': 0, 'unrecorded': 0, 'stages': self.stages}
+
+        self._completed = set()     # batches recorded in the journal by a previous run
+        self._outcomes = dict()     # batch_no: [known, succeed, failed, written] of the batches in flight
+        self._request_failed = set()    # batches in flight with words that could not be requested
+        self._pending = dict()      # batch_no: Futures of the writes of the batch, not committed yet
+
+        self._batches = queue.Queue(queue_size)
+        self._requests = queue.Queue(queue_size)
+        self._results = queue.Queue(queue_size)
+        self._stop = threading.Event()
+
+    def run(self, words) -> dict:
+        """Ingest words (any iterable of str, e.g. an open file) and return statistics."""
+        start = time.perf_counter()
+        self._open_job()
+
+        threads = [threading.Thread(target=self._read, args=(words,), name='ingest-normalize', daemon=True)]
+        threads += [threading.Thread(target=self._fetch, name='ingest-fetch-{}'.format(i), daemon=True)
+                    for i in range(self.fetchers)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            self._run_database_stages()
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self.job is not None:
+            self.service.repo.finish_ingest_job(self.job)
+        else:
+            self.service.repo.flush()
+
+        self.stats['seconds'] = round(time.perf_counter() - start, 2)
+        return self.stats
+
+    def _open_job(self) -> None:
+        """Create the job in the journal, or load its completed batches if it is resumed."""
+        if self.job is None:
+            return
+
+        repo = self.service.repo
+        existing = repo.find_ingest_job(self.job)
+        if existing is None:
+            repo.create_ingest_job(self.job, self.batch_size)
+        elif not self.resume:
+            raise ValueError('Ingest job {!r} already exists, resume it or choose another name.'.format(self.job))
+        elif existing.batch_size != self.batch_size:
+            raise ValueError('Ingest job {!r} was started with batch_size={}, it can not be resumed with {}.'.format(
+                self.job, existing.batch_size, self.batch_size))
+        else:
+            self._completed = repo.completed_batches(self.job)
+
+    def _run_database_stages(self) -> None:
+        """Check batches against the database and write parsed chunks until all fetchers are done."""
+        running = self.fetchers
+        reading = True
+
+        while running:
+            if not reading:
+                running -= self._write(self._results.get())
+                continue
+
+            running -= self._drain_results()
+            try:
+                item = self._batches.get(timeout=IngestPipeline._POLL)
+            except queue.Empty:
+                continue
+
+            if isinstance(item, BaseException):
+                raise item
+            if item is IngestPipeline._DONE:
+                reading = False
+                for _ in range(self.fetchers):
+                    running -= self._put_draining(IngestPipeline._DONE)
+                continue
+
+            batch_no, titles = item
+            stage_start = time.perf_counter()
+            missing = self.service.repo.missing_search_words(titles)
+            self.stages['check'].add(len(titles), time.perf_counter() - stage_start)
+            self.stats['known'] += len(titles) - len(missing)
+            self._outcomes[batch_no] = [len(titles) - len(missing), 0, 0, 0]
+
+            if missing:
+                self.stats['requested'] += len(missing)
+                running -= self._put_draining((batch_no, missing))
+            else:
+                self._complete(batch_no)
+
+    def _put_draining(self, item) -> int:
+        """Put item to the fetch queue. While it is full, write parsed chunks, otherwise the fetchers could wait
+        for the results queue while this thread waits for them. Returns number of finished fetchers."""
+        finished = 0
+        while True:
+            try:
+                self._requests.put(item, timeout=IngestPipeline._POLL)
+                return finished
+            except queue.Full:
+                finished += self._drain_results()
+
+    def _drain_results(self) -> int:
+        """Write all chunks parsed so far. Returns number of finished fetchers."""
+        finished = 0
+        while True:
+            try:
+                finished += self._write(self._results.get_nowait())
+            except queue.Empty:
+                return finished
+
+    def _write(self, item) -> int:
+        """Write stage. Returns 1 if the item is the end mark of a fetcher, otherwise 0."""
+        if item is IngestPipeline._DONE:
+            return 1
+        if isinstance(item, BaseException):
+            raise item
+
+        batch_no, batch = item
+        if batch is None:
+            # All chunks of the batch were written.
+            self._complete(batch_no)
+            return 0
+
+        stage_start = time.perf_counter()
+        repo = self.service.repo
+        self._pending.setdefault(batch_no, []).append((
+            repo.insert_many(batch.rows(SuccessfulResponse), wait=False),
+            repo.insert_aliases(batch.alias_rows(), wait=False),
+            repo.insert_failed(batch.failed_rows(), self.service.failed_ttl, wait=False)))
+        self.stages['write'].add(len(batch), time.perf_counter() - stage_start)
+
+        succeed = len(batch.select(SuccessfulResponse))
+        self.stats['succeed'] += succeed
+        self.stats['failed'] += len(batch) - succeed
+
+        outcome = self._outcomes[batch_no]
+        outcome[1] += succeed
+        outcome[2] += len(batch) - succeed
+        if batch.select(FailedRequestResponse):
+            self._request_failed.add(batch_no)
+
+        if self.progress is not None:
+            self.progress(self.stats, batch)
+        return 0
+
+    def _complete(self, batch_no: int) -> None:
+        """Record the batch in the journal once all its responses are saved, unless some of its words
+        could not be requested."""
+        outcome = self._outcomes.pop(batch_no)
+
+        stage_start = time.perf_counter()
+        # A failed write raises here, so the batch is not recorded and a resumed job writes it again.
+        for rows, aliases, failed in self._pending.pop(batch_no, ()):
+            counts = rows.result()
+            aliases.result()
+            failed.result()
+            outcome[3] += counts['inserted'] + counts['updated']
+        self.stages['write'].add(0, time.perf_counter() - stage_start)
+        self.stats['written'] += outcome[3]
+
+        if batch_no in self._request_failed:
+            self._request_failed.discard(batch_no)
+            self.stats['unrecorded'] += 1
+        elif self.job is not None:
+            # Committed after the rows of the batch, the writer keeps the order of writes.
+            self.service.repo.record_batch(self.job, batch_no, *outcome, wait=False)
+        self.stats['batches'] += 1
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        """Put item from a worker thread. Gives up and returns False if the pipeline is stopped."""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=IngestPipeline._POLL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _read(self, words) -> None:
+        """Normalize stage: group normalized words into numbered batches of unique titles.
+        Batches recorded in the journal are skipped."""
+        batch = dict()
+        batch_no = 0
+        stage_start = time.perf_counter()
+        try:
+            for word in words:
+                self.stats['words'] += 1
+                title = normalize_title(word)
+                if title:
+                    batch[title] = None
+
+                if len(batch) == self.batch_size:
+                    if not self._emit(batch_no, batch, stage_start):
+                        return
+                    batch = dict()
+                    batch_no += 1
+                    stage_start = time.perf_counter()
+
+            if batch and not self._emit(batch_no, batch, stage_start):
+                return
+            self._put(self._batches, IngestPipeline._DONE)
+
+        except Exception as error:
+            self._put(self._batches, error)
+
+    def _emit(self, batch_no: int, batch: dict, stage_start: float) -> bool:
+        self.stages['normalize'].add(len(batch), time.perf_counter() - stage_start)
+        self.stats['titles'] += len(batch)
+
+        if batch_no in self._completed:
+            self.stats['resumed'] += 1
+            return True
+        return self._put(self._batches, (batch_no, list(batch)))
+
+    def _fetch(self) -> None:
+        """Fetch and parse stages: request batches chunk by chunk and parse every chunk as it is received."""
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = self._requests.get(timeout=IngestPipeline._POLL)
+                except queue.Empty:
+                    continue
+
+                if item is IngestPipeline._DONE:
+                    break
+
+                batch_no, titles = item
+                stage_start = time.perf_counter()
+                for js in self.service.wiki_http.iter_get(titles):
+                    parse_start = time.perf_counter()
+                    self.stages['fetch'].add(len(js['query']['pages']), parse_start - stage_start)
+
+                    batch = ResponseBatch(js)
+                    self.stages['parse'].add(len(batch), time.perf_counter() - parse_start)
+
+                    if not self._put(self._results, (batch_no, batch)):
+                        return
+                    stage_start = time.perf_counter()
+
+                if not self._put(self._results, (batch_no, None)):
+                    return
+
+            self._put(self._results, IngestPipeline._DONE)
+
+        except Exception as error:
+            self._put(self._results, error)
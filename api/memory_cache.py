@@ -0,0 +1,70 @@
+#!api/memory_cache.py Python3
+"""
+This module contains MemoryCache, the in-process LRU cache of responses used by WikiService.lookup_many.
+
+It is the first tier of a lookup: a word found here costs a dict lookup, no SQLite query and no request.
+Entries are keyed by the normalized title and evicted in least recently used order above max_entries.
+The cache lives as long as the process, changes of the database made by others are not seen by it.
+
+Example:
+    cache = MemoryCache(max_entries=10000)
+    cache.put_many({'Python': response})
+    cache.get_many(['Python', 'Algebra'])   # {'Python': response}
+"""
+import threading
+from collections import OrderedDict
+
+
+class MemoryCache:
+    """Thread-safe LRU cache of responses.
+    Args:
+        max_entries: int, maximum number of cached words, default=10000
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return '{}(entries={}, hits={}, misses={}, hit_ratio={:.2f})'.format(self.__class__.__name__, len(self),
+                                                                           self.hits, self.misses, self.hit_ratio)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get_many(self, words) -> dict:
+        """Return {word: response} of the cached words and mark them as recently used."""
+        found = dict()
+        with self._lock:
+            for word in words:
+                response = self._entries.get(word)
+                if response is not None:
+                    self._entries.move_to_end(word)
+                    found[word] = response
+
+            self.hits += len(found)
+            self.misses += len(words) - len(found)
+        return found
+
+    def put_many(self, responses: dict) -> None:
+        """Store {word: response} and evict the least recently used entries above max_entries."""
+        with self._lock:
+            self._entries.update(responses)
+            for word in responses:
+                self._entries.move_to_end(word)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries and reset counters."""
+        with self._lock:
+            self._entries.clear()
+        self.hits = self.misses = 0
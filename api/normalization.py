@@ -0,0 +1,38 @@
+#!api/normalization.py Python3
+"""
+This module normalizes searched words into MediaWiki titles, the same way MediaWiki does it:
+    1. Underscores are replaced with white space
+    2. Runs of white space are collapsed into one space and both sides are trimmed
+    3. First letter is capital (all others are up to the input since MediaWiki is case sensitive)
+A word that is empty after normalization (e.g. blank line) is dropped.
+
+Normalized titles are memoized, so repeated words (the usual case for bulk word lists) cost a dict lookup.
+
+Example:
+    titles, mapping = normalize_titles(['python_programming', ' Python  programming', '', 'Python'])
+    titles  == ['Python programming', 'Python']
+    mapping == {'python_programming': 'Python programming', ' Python  programming': 'Python programming',
+                'Python': 'Python'}
+"""
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1 << 16)
+def normalize_title(word: str) -> str:
+    """Return MediaWiki title of a word, '' if the word is blank."""
+    title = ' '.join(word.replace('_', ' ').split())
+    return title[:1].upper() + title[1:]
+
+
+def normalize_titles(words) -> tuple:
+    """Normalize words in linear time.
+    Args:
+        words: list or str of words
+    Returns:
+        tuple (titles, mapping):
+            titles - list of unique titles in order of their first occurrence
+            mapping - dict {word: title} for every non-blank word
+    """
+    words = [words] if isinstance(words, str) else words
+    mapping = {word: title for word, title in zip(words, map(normalize_title, words)) if title}
+    return list(dict.fromkeys(mapping.values())), mapping
@@ -0,0 +1,85 @@
+#!api/rate_limiter.py Python3
+"""
+This module contains RateLimiter, the throttle of the HTTP layer (WikiHttp and AsyncWikiHttp).
+
+Requests are paced by a token bucket: 'rate' tokens per second are added to the bucket (up to 'burst' tokens)
+and every request takes one token. The rate is adapted with AIMD (additive increase, multiplicative decrease):
+    - every successful response increases the rate by 'increase' requests per second (up to max_rate),
+    - every throttled response (HTTP 429/503, MediaWiki 'maxlag' error) multiplies the rate by 'decrease'
+        (down to min_rate) and blocks all requests for Retry-After seconds.
+This way the client converges to the highest rate Wikipedia sustains without blocking it.
+
+RateLimiter does not sleep by itself: reserve() returns how long the caller has to wait,
+so the same object can be used by threads (time.sleep) and by coroutines (asyncio.sleep).
+"""
+import threading
+import random
+import time
+
+
+class RateLimiter:
+    """Token bucket with AIMD rate control.
+    Args:
+        rate: initial number of requests per second, default=20
+        min_rate: lowest rate after throttling, default=1
+        max_rate: highest rate after successful responses, default=200
+        burst: capacity of the bucket (requests that can be sent at once), default=10
+        increase: rate added after every successful response, default=0.5
+        decrease: factor the rate is multiplied by after a throttled response, default=0.5
+    """
+
+    def __init__(self, rate=20, min_rate=1, max_rate=200, burst=10, increase=0.5, decrease=0.5):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+
+        self._rate = float(rate)
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '{}(rate={:.2f})'.format(self.__class__.__name__, self.rate)
+
+    @property
+    def rate(self) -> float:
+        """Current number of requests per second."""
+        return self._rate
+
+    def reserve(self) -> float:
+        """Take one token and return number of seconds the caller has to wait before sending the request."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self._rate)
+            self._updated_at = now
+            self._tokens -= 1
+
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self) -> None:
+        """Block the current thread until a request can be sent."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def success(self) -> None:
+        """Additive increase of the rate after a successful response."""
+        with self._lock:
+            self._rate = min(self.max_rate, self._rate + self.increase)
+
+    def throttle(self, retry_after=None) -> None:
+        """Multiplicative decrease of the rate after a throttled response.
+        All requests are blocked for retry_after seconds if it is given."""
+        with self._lock:
+            self._rate = max(self.min_rate, self._rate * self.decrease)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+    @staticmethod
+    def backoff(attempt: int, base=0.5, cap=30.0) -> float:
+        """Exponential backoff with full jitter: random delay in [0, min(cap, base * 2 ** attempt)]."""
+        return random.uniform(0, min(cap, base * 2 ** attempt))
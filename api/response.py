@@ -67,98 +67,164 @@ The class ResponseParser will store
 for every page received from WikiMedia.
 
 In case if any particular response is out of the option, 'UnknownResponse' will be returned.
+A word that could not be requested at all (see WikiHttp._failed_page) is 'FailedRequestResponse'.
+
+Responses that are a property of the word itself (missing, invalid, disambiguation) have a 'reason' code.
+They are remembered in the database for a while, so they are not requested again (see Repository.insert_failed).
+
+For big JSONs (merged batches of thousands of pages), ResponseBatch stores the same information column-wise:
+parallel arrays of page_id/title/search_word/meaning and an array of status codes (index of the response class),
+without creating an object per page.
 
 """
+from array import array
+from collections import Counter
 
 
 class Response:
-    """Base class for WikiMedia responses."""
+    """Base class for WikiMedia responses.
+    Every direct subclass that sets 'positive' takes part in identification of a page (see Response.identify):
+        positive - True for pages with a page id (> 0), False for pages without one (missing, invalid, ...)
+        marker - key of the page that identifies the class among the pages of the same sign, None for the class
+            of the pages without any of the markers
+    If a page has several markers (e.g. a failed request also has 'invalidreason'), the class defined first wins.
+    Responses use __slots__, subclasses that add attributes have to declare them in their own __slots__.
+    """
+
+    __slots__ = ('page_id', 'title')
+
+    positive = None
+    marker = None
+    reason = None       # Reason code stored in tbl_wiki_failed, None means the response is not remembered.
+
+    # Compiled from the subclasses, reset whenever a new subclass is defined:
+    _classes = None     # subclasses that identify pages, in the order of their definition
+    _markers = None     # {positive: markers to look for, in the order of definition of their classes}
+    _dispatch = None    # {(positive, marker): subclass}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        Response._classes = None
+
+    @staticmethod
+    def response_classes() -> tuple:
+        """Return subclasses of Response that can identify a page, in the order of their definition."""
+        if Response._classes is None:
+            classes = tuple(cls for cls in Response.__subclasses__() if cls.positive is not None)
+            Response._markers = {positive: tuple(dict.fromkeys(cls.marker for cls in classes
+                                                               if cls.positive is positive and cls.marker))
+                                 for positive in (True, False)}
+            Response._dispatch = {(cls.positive, cls.marker): cls for cls in reversed(classes)}
+            Response._classes = classes
+        return Response._classes
+
+    @staticmethod
+    def identify(page_id: int, page: dict) -> type:
+        """Return the response class of a page: one lookup by the sign of page_id and the first marker of the page."""
+        Response.response_classes()
+        positive = page_id > 0
+        marker = next((key for key in Response._markers[positive] if key in page), None)
+        return Response._dispatch.get((positive, marker), UnknownResponse)
 
     def __init__(self, page_id,  **kwargs):
         self.page_id = int(page_id)
         self.title = kwargs.get('title')
 
     def __repr__(self):
-        return '{}: {}'.format(self.__class__.__name__, self.__dict__)
+        return '{}: {}'.format(self.__class__.__name__, self._asdict())
 
-    @staticmethod
-    def meets_condition(page_id, page) -> bool:
-        return False
+    def _asdict(self) -> dict:
+        """Attributes of the response (all __slots__ of the class and its parents)."""
+        slots = (slot for cls in reversed(self.__class__.__mro__) for slot in cls.__dict__.get('__slots__', ()))
+        return {slot: getattr(self, slot, None) for slot in slots}
 
 
 class MissingResponse(Response):
     """Missing response from WikiMedia. The requested page is not found."""
 
-    @staticmethod
-    def meets_condition(page_id, page):
-        return (
-            int(page_id) <= 0
-            and 'missing' in page
-        )
+    __slots__ = ()
+
+    positive = False
+    marker = 'missing'
+
+    reason = 'missing'
+
+
+class FailedRequestResponse(Response):
+    """The word could not be requested from WikiMedia (network error, retries are exhausted). It is not a property
+    of the word, so it is not remembered. Defined before InvalidResponse, since the page has the shape of an invalid
+    page (see Response.identify)."""
+
+    __slots__ = ()
+
+    positive = False
+    marker = 'requestfailed'
 
 
 class InvalidResponse(Response):
     """Invalid response from WikiMedia. The requested page title contains invalid characters: \"[\" or is empty."""
 
-    @staticmethod
-    def meets_condition(page_id, page):
-        return (
-                int(page_id) <= 0
-                and 'invalidreason' in page
-        )
+    __slots__ = ()
+
+    positive = False
+    marker = 'invalidreason'
+
+    reason = 'invalid'
 
 
 class DisambiguationResponse(Response):
     """Disambiguation response from WikiMedia. More than one page exist in WikiMedia for a word searched."""
 
-    @staticmethod
-    def meets_condition(page_id, page):
-        return (
-            int(page_id) > 0
-            and 'pageprops' in page
-        )
+    __slots__ = ()
+
+    positive = True
+    marker = 'pageprops'
+
+    reason = 'disambiguation'
 
 
 class SuccessfulResponse(Response):
     """Successful response from WikiMedia. Meaning of a searched word has been found."""
 
+    __slots__ = ('meaning', 'search_word')
+
+    positive = True
+    marker = None
+
     def __init__(self, page_id, **kwargs):
         """Named arguments from kwargs:
             extract: meaning of a word from JSON WikiMedia
-            searchword: added key to the JSON.
+            searchword: passed by ResponseParser.
                 If redirects is NULL, searchword=title, otherwise searchword=redirects['from']"""
 
         super().__init__(page_id, **kwargs)
         self.meaning = kwargs.get('extract')
         self.search_word = kwargs.get('searchword')
 
-    @staticmethod
-    def meets_condition(page_id, page):
-        return (
-            int(page_id) > 0
-            and 'pageprops' not in page
-        )
-
 
 class UnknownResponse(Response):
     """A type of response that cannot be identified from its data."""
 
+    __slots__ = ()
+
 
 class ResponseParser:
-    """Parse JSON from WikiMedia and identify responses that occurred in the JSON."""
+    """Parse JSON from WikiMedia and identify responses that occurred in the JSON.
+    Indexes of redirects and normalized titles are built once per JSON, so every page is parsed in constant time."""
 
     def __init__(self, json: dict):
 
         self.page_ids = json['query']['pageids']
         self.pages = json['query']['pages']
         self.redirects = json['query']['redirects'] if 'redirects' in json['query'] else dict()
+        self.normalized = json['query']['normalized'] if 'normalized' in json['query'] else dict()
+        self.redirect_index = self._build_index(self.redirects)
+        self.normalized_index = self._build_index(self.normalized)
         self.data = list()
 
-        # For every page in pages, key searchword is created to check if a word searched is redirected.
-        # If a word search is  redirected, than searchword=redirects['from'], otherwise searchword=title.
         for page_id in self.page_ids:
-            self.pages[page_id]['searchword'] = self._find_redirect_word(self.redirects, self.pages[page_id]['title'])
-            self.data.append(self._identify_response(page_id, self.pages[page_id]))
+            self.data.append(self._parse_page(page_id, self.pages[page_id], self.redirect_index,
+                                              self.normalized_index))
 
     def __getitem__(self, index):
         return self.data[index]
@@ -170,23 +236,181 @@ class ResponseParser:
         return str([cls.__class__.__name__ for cls in self.data])
 
     @staticmethod
-    def _find_redirect_word(redirects: dict, word: str) -> str:
-        for r in redirects:
-            if r['to'] == word:
-                return r['from']
+    def iter_responses(json: dict):
+        """Lazy version of ResponseParser: yield responses one by one while walking pageids,
+        nothing is stored. JSON is not modified."""
+        query = json['query']
+        redirect_index = ResponseParser._build_index(query.get('redirects', ()))
+        normalized_index = ResponseParser._build_index(query.get('normalized', ()))
+
+        for page_id in query['pageids']:
+            yield ResponseParser._parse_page(page_id, query['pages'][page_id], redirect_index, normalized_index)
+
+    @staticmethod
+    def _parse_page(page_id, page: dict, redirect_index: dict, normalized_index: dict) -> Response:
+        """Identify a page and create its response.
+        searchword is passed to check if a word searched is redirected.
+        If a word search is  redirected, than searchword=redirects['from'], otherwise searchword=title.
+        If the word was normalized by MediaWiki, the word as it was sent is used. JSON itself is not modified."""
+        response_cls = Response.identify(int(page_id), page)
+        search_word = ResponseParser._find_search_word(page.get('title'), redirect_index, normalized_index)
+        return response_cls(page_id, searchword=search_word, **page)
 
-        return word
+    @staticmethod
+    def _build_index(entries) -> dict:
+        """Index {'to': 'from'} of redirects or normalized entries. The first entry wins for the same 'to'."""
+        index = dict()
+        for entry in entries:
+            index.setdefault(entry['to'], entry['from'])
+        return index
+
+    @staticmethod
+    def _find_search_word(title: str, redirect_index: dict, normalized_index: dict) -> str:
+        """Return the word that was searched for a page title: resolve redirect first, then normalization.
+        The search word is the word as it was sent, not the title normalized by MediaWiki: the database is checked
+        by the sent words (see WikiService.check_database), so a stored page is found by the same word next time
+        even if MediaWiki normalizes more than api/normalization.py (e.g. 'wikipedia:x' -> 'Wikipedia:X').
+        The normalized title is not lost, ResponseBatch keeps it as an alias of the page."""
+        word = redirect_index.get(title, title)
+        return normalized_index.get(word, word)
+
+
+class ResponseBatch:
+    """Columnar version of ResponseParser. Pages of JSON are identified the same way, but stored in parallel
+    arrays instead of Response objects. status is the index of the response class in 'classes'.
+    JSON is not modified.
+
+    A batch can be extended by JSONs of more chunks (see WikiHttp.iter_get) while they arrive.
+    A page that is already in the batch (the same positive page_id) is not added again, its new names are added
+    to its aliases.
+
+    Besides search_word, every page keeps its other names in 'aliases': its title and all redirected
+    and normalized words that lead to it, so that all of them can be stored in tbl_wiki_alias.
+
+    Example:
+        batch = ResponseBatch(json)
+        repo.insert_many(batch.rows(SuccessfulResponse))
+        failed = batch.responses(SuccessfulResponse, negate=True)
+    """
+
+    def __init__(self, json=None):
+        self.classes = Response.response_classes() + (UnknownResponse,)
+        self.page_ids = array('q')
+        self.statuses = array('B')
+        self.titles = list()
+        self.search_words = list()
+        self.meanings = list()
+        self.aliases = list()
+        self._known_page_ids = dict()   # page_id: index of the page
+
+        if json is not None:
+            self.extend(json)
+
+    def extend(self, json: dict) -> list:
+        """Identify pages of JSON and append them to the batch.
+        A page that is already in the batch (e.g. another word of a later chunk redirects to it) is not appended
+        again, the names that lead to it are added to its aliases.
+        Returns:
+            list: indexes of the pages appended before, whose aliases were extended
+        """
+        query = json['query']
+        redirects, normalized = query.get('redirects', ()), query.get('normalized', ())
+        redirect_index = ResponseParser._build_index(redirects)
+        normalized_index = ResponseParser._build_index(normalized)
+        redirect_sources = ResponseBatch._build_sources(redirects)
+        normalized_sources = ResponseBatch._build_sources(normalized)
+        # A class defined after the batch was created is not one of its classes, its pages are unknown.
+        status_of = {cls: status for status, cls in enumerate(self.classes)}
+        unknown = len(self.classes) - 1
+        extended = []
+
+        for page_id in query['pageids']:
+            page = query['pages'][page_id]
+            page_id = int(page_id)
+            title = page.get('title')
+            search_word = ResponseParser._find_search_word(title, redirect_index, normalized_index)
+            aliases = ()
+
+            if page_id > 0:
+                aliases = ResponseBatch._find_aliases(title, search_word, redirect_sources, normalized_sources)
+
+                if page_id in self._known_page_ids:
+                    index = self._known_page_ids[page_id]
+                    self.aliases[index] = tuple(dict.fromkeys(self.aliases[index] + aliases + (search_word,)))
+                    extended.append(index)
+                    continue
+                self._known_page_ids[page_id] = len(self.page_ids)
+
+            self.page_ids.append(page_id)
+            self.statuses.append(status_of.get(Response.identify(page_id, page), unknown))
+            self.titles.append(title)
+            self.search_words.append(search_word)
+            self.meanings.append(page.get('extract'))
+            self.aliases.append(aliases)
+
+        return extended
+
+    @staticmethod
+    def _build_sources(entries) -> dict:
+        """Index {'to': ['from', ...]} of redirects or normalized entries, all sources are kept."""
+        index = dict()
+        for entry in entries:
+            index.setdefault(entry['to'], []).append(entry['from'])
+        return index
 
     @staticmethod
-    def _identify_response(page_id, page: dict) -> Response:
-        for response_cls in Response.__subclasses__():
-            try:
-                if response_cls.meets_condition(page_id, page):
-                    return response_cls(page_id, **page)
-            except KeyError:
-                continue
-
-        return UnknownResponse(page_id)
+    def _find_aliases(title: str, search_word: str, redirect_sources: dict, normalized_sources: dict) -> tuple:
+        """All names that lead to the page title (the title, redirected and normalized words), except search_word."""
+        names = [title]
+        names.extend(redirect_sources.get(title, ()))
+        for name in list(names):
+            names.extend(normalized_sources.get(name, ()))
+        return tuple(name for name in dict.fromkeys(names) if name != search_word)
+
+    def __len__(self):
+        return len(self.page_ids)
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, self.counts())
+
+    def counts(self) -> dict:
+        """Number of pages per response class name."""
+        return {self.classes[status].__name__: count for status, count in Counter(self.statuses).items()}
+
+    def select(self, response_cls: type, negate=False, start=0) -> list:
+        """Indexes of pages identified as response_cls (or of all other pages if negate=True),
+        starting from index 'start'."""
+        status = self.classes.index(response_cls)
+        return [i for i in range(start, len(self.statuses)) if (self.statuses[i] == status) != negate]
+
+    def rows(self, response_cls=SuccessfulResponse, negate=False, start=0):
+        """Yield (page_id, title, meaning, search_word) of the selected pages, ready for Repository.insert_many."""
+        for i in self.select(response_cls, negate, start):
+            yield self.page_ids[i], self.titles[i], self.meanings[i], self.search_words[i]
+
+    def alias_rows(self, response_cls=SuccessfulResponse, start=0, indexes=()):
+        """Yield (alias, page_id) for search_word and every alias of the selected pages, ready for
+        Repository.insert_aliases. Pages before 'start' at 'indexes' are selected too (see extend)."""
+        status = self.classes.index(response_cls)
+        earlier = [i for i in dict.fromkeys(indexes) if i < start and self.statuses[i] == status]
+        for i in earlier + self.select(response_cls, start=start):
+            yield self.search_words[i], self.page_ids[i]
+            for alias in self.aliases[i]:
+                yield alias, self.page_ids[i]
+
+    def failed_rows(self, start=0):
+        """Yield (search_word, title, reason, page_id) of the pages whose response class has a reason code
+        (starting from index 'start'), ready for Repository.insert_failed."""
+        for i in range(start, len(self)):
+            reason = self.classes[self.statuses[i]].reason
+            if reason is not None:
+                yield self.search_words[i], self.titles[i], reason, self.page_ids[i]
+
+    def responses(self, response_cls=None, negate=False) -> list:
+        """Create Response objects of the selected pages (all pages if response_cls is None)."""
+        indexes = range(len(self)) if response_cls is None else self.select(response_cls, negate)
+        return [self.classes[self.statuses[i]](self.page_ids[i], title=self.titles[i], extract=self.meanings[i],
+                                               searchword=self.search_words[i]) for i in indexes]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,125 @@
+#!api/response_cache.py Python3
+"""
+This module contains ResponseCache, an optional on-disk cache for WikiHttp.
+
+Every searched title is stored as its own small JSON (the page of the title and its normalized/redirects entries,
+see WikiHttp._split), keyed by the normalized title and the query parameters. This way a title is served from the
+cache no matter which batch of words it was requested in.
+
+    - ttl: entries older than ttl seconds are treated as missing and requested again.
+    - max_entries: when the cache grows bigger, the least recently used entries are evicted.
+    - replay: the cache never goes to the network. A title that is not cached raises CacheMissError,
+        so test and benchmark runs are served entirely from recorded responses.
+
+Example:
+    cache = ResponseCache('repository/http_cache.db', ttl=7*24*3600)
+    http = WikiHttp(cache=cache)
+    http.get(['Python'])    # miss, requested from MediaWiki and recorded
+    http.get(['python'])    # hit
+"""
+import sqlite3
+import threading
+import json
+import time
+from api.normalization import normalize_title
+
+
+class CacheMissError(LookupError):
+    """Raised in replay mode when a title has not been recorded."""
+
+
+class ResponseCache:
+    """Persistent TTL/LRU cache of MediaWiki responses per title.
+    Args:
+        path: str, path of the SQLite file, default=':memory:'
+        ttl: int, time to live of an entry in seconds, None means entries never expire, default=None
+        max_entries: int, maximum number of cached titles, default=100000
+        replay: bool, serve only recorded responses and raise CacheMissError otherwise, default=False
+    """
+
+    def __init__(self, path=':memory:', ttl=None, max_entries=100000, replay=False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+
+        # WikiHttp can be shared between threads, so the connection is shared and guarded by a lock.
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript("""
+                                CREATE TABLE IF NOT EXISTS http_cache (
+                                cache_key TEXT PRIMARY KEY,
+                                payload TEXT NOT NULL,
+                                created_at REAL NOT NULL,
+                                accessed_at REAL NOT NULL);
+
+                                CREATE INDEX IF NOT EXISTS idx_http_cache_accessed_at ON http_cache(accessed_at);
+                                """)
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute('SELECT COUNT(*) FROM http_cache').fetchone()[0]
+
+    def __repr__(self):
+        return '{}(hits={}, misses={}, hit_ratio={:.2f})'.format(self.__class__.__name__, self.hits, self.misses,
+                                                                 self.hit_ratio)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @staticmethod
+    def _key(title: str, params: dict) -> str:
+        """Cache key: title normalized the way MediaWiki does it plus all query parameters except titles."""
+        title = normalize_title(title)
+        params = {k: v for k, v in params.items() if k != 'titles'}
+        return title + '\x00' + json.dumps(params, sort_keys=True)
+
+    def get_many(self, titles: list, params: dict) -> dict:
+        """Return {title: JSON} for the cached titles. Titles that are not cached or expired are counted as misses.
+        In replay mode, a miss raises CacheMissError."""
+        now = time.time()
+        found = dict()
+
+        with self._lock:
+            for title in titles:
+                row = self.connection.execute('SELECT payload, created_at FROM http_cache WHERE cache_key = ?',
+                                              (ResponseCache._key(title, params),)).fetchone()
+
+                if row is not None and (self.ttl is None or now - row[1] <= self.ttl):
+                    found[title] = json.loads(row[0])
+
+            self.connection.executemany('UPDATE http_cache SET accessed_at = ? WHERE cache_key = ?',
+                                        ((now, ResponseCache._key(title, params)) for title in found))
+            self.connection.commit()
+
+        self.hits += len(found)
+        self.misses += len(titles) - len(found)
+
+        if self.replay and len(found) != len(titles):
+            raise CacheMissError('Titles are not recorded: {}'.format([t for t in titles if t not in found]))
+
+        return found
+
+    def put_many(self, payloads: dict, params: dict) -> None:
+        """Store {title: JSON} and evict the least recently used entries above max_entries."""
+        now = time.time()
+
+        with self._lock:
+            self.connection.executemany('INSERT OR REPLACE INTO http_cache(cache_key, payload, created_at, accessed_at) '
+                                        'VALUES(?, ?, ?, ?)',
+                                        ((ResponseCache._key(title, params), json.dumps(payload), now, now)
+                                         for title, payload in payloads.items()))
+            self.connection.execute('DELETE FROM http_cache WHERE cache_key IN ('
+                                    'SELECT cache_key FROM http_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                                    (self.max_entries,))
+            self.connection.commit()
+
+    def clear(self) -> None:
+        """Remove all entries and reset counters."""
+        with self._lock:
+            self.connection.execute('DELETE FROM http_cache')
+            self.connection.commit()
+        self.hits = self.misses = 0
@@ -55,10 +55,39 @@ Example:
 """
 import requests
 import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from api.rate_limiter import RateLimiter
+
+
+class WikiHttpError(Exception):
+    """MediaWiki request failed: API error, unexpected HTTP status or retries are exhausted."""
+
+
+class WikiHttpRetryError(WikiHttpError):
+    """Retries of a request are exhausted (throttling, server or connection errors). Unlike other WikiHttpError,
+    the failure does not depend on the words of the request."""
 
 
 class WikiHttp:
-    """WikiHttp requests a JSON from MediaWiki based on words provided."""
+    """WikiHttp requests a JSON from MediaWiki based on words provided.
+    Args:
+        chunk_size: number of titles sent in one request, default=50 (MediaWiki limit of titles per request).
+            prop=extracts returns at most 20 extracts per request, the rest is requested by continuation.
+        max_workers: number of requests run concurrently when words do not fit into one chunk, default=8
+        pool_connections: number of per-host connection pools kept by the session, default=1
+        pool_maxsize: number of keep-alive connections kept open per host,
+            default=max_workers + hedge_workers if hedge is on, else max_workers
+        cache: ResponseCache object, responses of cached titles are not requested again, default=None (no cache)
+        rate_limiter: RateLimiter object that paces requests, default=RateLimiter()
+        max_retries: number of retries of a throttled or failed request, default=5
+        timeout: timeout of a single request in seconds, default=15
+        hedge: send a duplicate request for a chunk that runs longer than 95% of recent chunks, default=True.
+            Duplicates run on hedge_workers (max(1, max_workers // 4)) threads of their own, so they do not wait
+            for queued chunks.
+        url: URL of MediaWiki api.php, default=_URL (English Wikipedia)
+    """
 
     _PARAMS = {
         'action': 'query',              # Fetch data from and about MediaWiki.
@@ -67,27 +96,326 @@ class WikiHttp:
         'exintro': True,                # Return only content before the first section (type=boolean)
         'explaintext': True,            # Return extracts as plain text instead of limited HTML (type=boolean)
         'exsentences': 3,               # How many sentences to return (max=10, type=integer).
+        'exlimit': 'max',               # How many extracts to return (max=20 with exintro, the rest is continued).
         'redirects': True,              # Automatically resolve redirects in query+titles (type=boolean).
         'indexpageids': True,           # Include pageids section listing all returned page IDs (type=boolean)
+        'maxlag': 5,                    # Return 'maxlag' error if database replicas lag more than 5 seconds.
         'format': 'json'}               # The format of the output (JSON).
 
     _URL = 'http://en.wikipedia.org/w/api.php'
 
+    _HEADERS = {'Accept-Encoding': 'gzip, deflate'}
+
+    _TITLES_LIMIT = 50                  # Maximum number of titles MediaWiki accepts in one request.
+
+    _HEDGE_QUANTILE = 0.95              # Chunks slower than this quantile of recent latencies are hedged.
+    _HEDGE_MIN_SAMPLES = 20             # Latencies needed before hedging starts.
+
+    def __init__(self, chunk_size=50, max_workers=8, pool_connections=1, pool_maxsize=None, cache=None,
+                 rate_limiter=None, max_retries=5, timeout=15, hedge=True, url=None):
+        self.chunk_size = min(chunk_size, WikiHttp._TITLES_LIMIT)
+        self.max_workers = max_workers
+        self.cache = cache
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.hedge = hedge
+        self.latencies = deque(maxlen=200)
+        self.url = url or WikiHttp._URL
+
+        # One long-lived session reuses keep-alive connections between requests and chunks.
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections,
+                                                pool_maxsize=pool_maxsize or max_workers
+                                                + (self.hedge_workers if hedge else 0))
+        self.session = requests.Session()
+        self.session.headers.update(WikiHttp._HEADERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def hedge_workers(self) -> int:
+        """Number of threads of the duplicates of hedged chunks."""
+        return max(1, self.max_workers // 4)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        """Close all pooled connections of the session."""
+        self.session.close()
+
     def get(self, words):
         """
-        Do request get from MediaWiki.
+        Do request get from MediaWiki. Words are split into chunks of 'chunk_size' titles and the chunks
+        are requested concurrently. All responses are merged into one JSON of the same shape.
+        If cache is set, only the words that are not cached are requested and their responses are recorded.
         Args:
                 words: list or str of words
         Returns:
             dict: JSON serialization
         """
-        params = WikiHttp._PARAMS
-        params['titles'] = '|'.join(words) if type(words) == list else words
-        # logger.info(params['titles'])
-        response = requests.get(url=WikiHttp._URL, params=params, timeout=15)
-        js = json.loads(response.text)
+        return WikiHttp._merge(self.iter_get(words))
+
+    def iter_get(self, words):
+        """
+        The same as get, but JSONs are yielded one by one as soon as they are received instead of being merged:
+        first the JSON of all cached words (if cache is set), then the JSON of every chunk in order of completion.
+        Args:
+                words: list or str of words
+        Yields:
+            dict: JSON serialization
+        """
+        words = words if type(words) == list else [words]
+
+        if self.cache is not None:
+            cached = self.cache.get_many(words, WikiHttp._PARAMS)
+            words = [word for word in words if word not in cached]
+            if len(cached):
+                yield WikiHttp._merge(cached.values())
+
+        for chunk, js in self._iter_words(words):
+            if self.cache is not None:
+                self.cache.put_many(WikiHttp._split(js, chunk), WikiHttp._PARAMS)
+            yield js
+
+    def _iter_words(self, words: list):
+        """Split words into chunks, request them concurrently and yield (chunk, JSON) in order of completion."""
+        chunks = [words[i:i + self.chunk_size] for i in range(0, len(words), self.chunk_size)]
+
+        if len(chunks) == 0:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(chunks))))
+        hedge_executor = ThreadPoolExecutor(max_workers=self.hedge_workers) if self.hedge else None
+        try:
+            for index, js in self._get_hedged(executor, hedge_executor, chunks):
+                yield chunks[index], js
+        finally:
+            # Do not wait for the losing duplicates of hedged chunks.
+            executor.shutdown(wait=False, cancel_futures=True)
+            if hedge_executor is not None:
+                hedge_executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_hedged(self, executor: ThreadPoolExecutor, hedge_executor, chunks: list):
+        """Request all chunks on the executor and yield (index of chunk, JSON) as they complete.
+        A chunk that has been running longer than the hedge delay is requested once more on hedge_executor
+        (a duplicate on the executor would only start after the queued chunks), and the response that comes first
+        is used."""
+        completed = set()
+        started = dict()
+        futures = {executor.submit(self._get_chunk_timed, index, chunk, started): index
+                   for index, chunk in enumerate(chunks)}
+        pending, hedged = set(futures), set()
+
+        while pending:
+            delay = self._hedge_delay()
+            done, pending = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if futures[future] not in completed:
+                    completed.add(futures[future])
+                    yield futures[future], future.result()
+
+            pending = {future for future in pending if futures[future] not in completed}
+
+            if delay is not None:
+                now = time.monotonic()
+                for index in set(futures[future] for future in pending) - hedged:
+                    if index in started and now - started[index] > delay:
+                        hedged.add(index)
+                        duplicate = hedge_executor.submit(self._get_chunk_timed, index, chunks[index], started)
+                        futures[duplicate] = index
+                        pending.add(duplicate)
+
+    def _hedge_delay(self):
+        """Return the hedge delay in seconds (quantile of recent chunk latencies) or None if hedging is off."""
+        if not self.hedge or len(self.latencies) < WikiHttp._HEDGE_MIN_SAMPLES:
+            return None
+
+        latencies = sorted(self.latencies)
+        return latencies[int(len(latencies) * WikiHttp._HEDGE_QUANTILE)]
+
+    def _get_chunk_timed(self, index: int, words: list, started: dict) -> dict:
+        started.setdefault(index, time.monotonic())
+        start = time.monotonic()
+        js = self._get_chunk_bisect(words)
+        self.latencies.append(time.monotonic() - start)
         return js
 
+    def _get_chunk_bisect(self, words: list) -> dict:
+        """Request a chunk of words. If MediaWiki rejects the request, the chunk is split in half and both halves
+        are requested again, so that only the words that make the request fail are lost.
+        A single word that fails is returned as an invalid page (see WikiHttp._failed_page). If retries are
+        exhausted, all words of the chunk are returned as failed pages: the failure does not depend on the words,
+        so requesting the halves would only multiply the failing requests."""
+        try:
+            return self._get_chunk(words)
+        except WikiHttpRetryError as e:
+            return WikiHttp._failed_pages(words, e)
+        except WikiHttpError as e:
+            if len(words) == 1:
+                return WikiHttp._failed_page(words[0], e)
+
+            middle = len(words) // 2
+            return WikiHttp._merge([self._get_chunk_bisect(words[:middle]), self._get_chunk_bisect(words[middle:])])
+
+    @staticmethod
+    def _failed_pages(words: list, error: Exception) -> dict:
+        """JSON of words that could not be requested, one failed page per word."""
+        return WikiHttp._merge(WikiHttp._failed_page(word, error) for word in words)
+
+    @staticmethod
+    def _failed_page(word: str, error: Exception) -> dict:
+        """JSON of a word that could not be requested. It has the shape of an invalid page with 'requestfailed' key,
+        so ResponseParser identifies it as FailedRequestResponse. The key also keeps it out of the cache."""
+        return {'query': {'pageids': ['-1'],
+                          'pages': {'-1': {'title': word, 'invalid': '', 'requestfailed': '',
+                                           'invalidreason': 'Request failed: {}'.format(error)}}}}
+
+    def _get_chunk(self, words: list) -> dict:
+        """Request a single chunk of words (len(words) <= chunk_size) from MediaWiki.
+        If the response is not complete (contains 'continue'), the request is repeated with
+        the continuation parameters until all extracts and pageprops of the chunk are received."""
+        params = dict(WikiHttp._PARAMS, titles='|'.join(words))
+        js = self._request(params)
+
+        while 'continue' in js:
+            params.update(js['continue'])
+            js = WikiHttp._merge_continued(js, self._request(params))
+
+        return js
+
+    def _request(self, params: dict) -> dict:
+        """Send one request paced by rate_limiter. Throttled responses (429, 503, maxlag), server errors and
+        connection errors are retried with jittered exponential backoff, honouring Retry-After."""
+        error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(RateLimiter.backoff(attempt))
+            self.rate_limiter.acquire()
+
+            try:
+                # logger.info(params['titles'])
+                response = self.session.get(url=self.url, params=params, timeout=self.timeout)
+                # Parse the (already decompressed) bytes directly, json detects the encoding itself.
+                js = json.loads(response.content) if response.ok else dict()
+            except (requests.RequestException, ValueError) as e:
+                error = e
+                self.rate_limiter.throttle()
+                continue
+
+            retry_after = WikiHttp._retry_after(response.status_code, response.headers, js)
+            if retry_after is not None:
+                error = 'HTTP {}: {}'.format(response.status_code, js.get('error', response.reason))
+                self.rate_limiter.throttle(retry_after)
+                continue
+
+            if not response.ok or 'error' in js:
+                raise WikiHttpError('HTTP {}: {}'.format(response.status_code, js.get('error', response.reason)))
+
+            self.rate_limiter.success()
+            return js
+
+        raise WikiHttpRetryError('Request failed after {} retries: {}'.format(self.max_retries, error))
+
+    @staticmethod
+    def _retry_after(status_code: int, headers, js: dict):
+        """Return number of seconds to wait if the response is throttled (429, maxlag) or the server failed (5xx),
+        otherwise None. Retry-After header is used if present (MediaWiki sends it with maxlag errors)."""
+        if status_code != 429 and status_code < 500 and js.get('error', {}).get('code') != 'maxlag':
+            return None
+
+        try:
+            return float(headers.get('Retry-After', 0))
+        except ValueError:
+            return 0.0
+
+    @staticmethod
+    def _merge_continued(js: dict, continued: dict) -> dict:
+        """Merge a continued response into the previous one. Continued response has the same pages,
+        but with properties (extract, pageprops) that did not fit into the previous one."""
+        pages = js['query']['pages']
+
+        for page_id, page in continued.get('query', {}).get('pages', {}).items():
+            for key, value in page.items():
+                if isinstance(value, dict) and isinstance(pages[page_id].get(key), dict):
+                    pages[page_id][key].update(value)
+                else:
+                    pages[page_id].setdefault(key, value)
+
+        js.pop('continue')
+        if 'continue' in continued:
+            js['continue'] = continued['continue']
+        if 'batchcomplete' in continued:
+            js['batchcomplete'] = continued['batchcomplete']
+
+        return js
+
+    @staticmethod
+    def _merge(responses) -> dict:
+        """Merge JSONs of several chunks into one JSON, so that ResponseParser can parse it at once.
+        pageids and pages are joined, normalized and redirects lists are concatenated.
+        Missing and invalid pages get negative ids (-1, -2, ...) within every response,
+        so they are renumbered to stay unique in the merged JSON."""
+        merged = {'batchcomplete': '', 'query': {'pageids': [], 'pages': {}}}
+        query = merged['query']
+        negative_id = 0
+
+        for js in responses:
+            if 'batchcomplete' not in js:
+                merged.pop('batchcomplete', None)
+
+            for key, value in js.get('query', {}).items():
+                if key in ('pageids', 'pages'):
+                    continue
+                if isinstance(value, list):
+                    query.setdefault(key, []).extend(value)
+
+            pages = js.get('query', {}).get('pages', {})
+            for page_id in js.get('query', {}).get('pageids', list(pages)):
+                if int(page_id) < 0:
+                    negative_id -= 1
+                    query['pageids'].append(str(negative_id))
+                    query['pages'][str(negative_id)] = pages[page_id]
+                elif page_id not in query['pages']:
+                    query['pageids'].append(page_id)
+                    query['pages'][page_id] = pages[page_id]
+
+        return merged
+
+    @staticmethod
+    def _split(js: dict, words: list) -> dict:
+        """Split JSON into one JSON per searched word: {word: JSON}. Every JSON contains the page the word
+        resolved to and the normalized/redirects entries that lead to it. Words without a page are skipped."""
+        query = js.get('query', {})
+        pages = query.get('pages', {})
+        normalized = {n['from']: n for n in query.get('normalized', [])}
+        redirects = {r['from']: r for r in query.get('redirects', [])}
+        titles = {page['title']: page_id for page_id, page in pages.items()
+                  if 'title' in page and 'requestfailed' not in page}
+        split = dict()
+
+        for word in words:
+            title, entries = word, dict()
+
+            if title in normalized:
+                entries['normalized'] = [normalized[title]]
+                title = normalized[title]['to']
+            if title in redirects:
+                entries['redirects'] = [redirects[title]]
+                title = redirects[title]['to']
+
+            if title in titles:
+                page_id = titles[title]
+                split[word] = {'batchcomplete': '',
+                               'query': dict(entries, pageids=[page_id], pages={page_id: pages[page_id]})}
+
+        return split
+
 
 if __name__ == '__main__':
     x = WikiHttp()
@@ -5,13 +5,25 @@ A facade is an object (here 'WikiService') that servisse as a front-facing inter
 underlying or structural code.
 
 In this case, WikiService masks as a composition WikiHttp, ParsingResponse and Repository objects.
+Read path: lookup_many answers words from the memory cache (MemoryCache), then from the database and requests only
+the rest from MediaWiki.
+Bulk imports of large word lists go through ingest, a streaming pipeline (see api/ingest_pipeline.py).
+The async methods (get_meanings_from_wiki_async, check_database_async) use AsyncWikiHttp instead of WikiHttp
+and return the same responses. Database work of the async methods runs in a worker thread (asyncio.to_thread),
+so it does not block the event loop. The AsyncWikiHttp created by the service keeps its session open between calls,
+close it with aclose (or use 'async with service') on the same event loop.
 
 """
 
+import asyncio
 from api.response import *
 from api.wiki_http import WikiHttp
+from api.async_wiki_http import AsyncWikiHttp
+from api.normalization import normalize_titles
+from api.ingest_pipeline import IngestPipeline
+from api.memory_cache import MemoryCache
 from repository.db_setup import Repository
-from constants import DB_PATH
+from constants import DB_PATH, FAILED_RESPONSE_TTL
 
 
 class WikiService:
@@ -19,55 +31,201 @@ class WikiService:
     Args:
          wiki_http - WikiHttp object that requests words from WikiService
          repo - Repository object (database)
+         async_wiki_http - AsyncWikiHttp object used by async methods, created on first use if not given
+                           (with the url of wiki_http, closed by aclose)
+         failed_ttl - seconds missing, invalid and disambiguation words are remembered and not requested again
+         memory_cache - MemoryCache object, the first tier of lookup_many, default=MemoryCache()
     """
 
-    def __init__(self, wiki_http: WikiHttp, repo: Repository):
+    def __init__(self, wiki_http: WikiHttp, repo: Repository, async_wiki_http: AsyncWikiHttp = None,
+                 failed_ttl=FAILED_RESPONSE_TTL, memory_cache: MemoryCache = None):
         self.wiki_http = wiki_http
         self.repo = repo
+        self.failed_ttl = failed_ttl
+        self.memory_cache = memory_cache if memory_cache is not None else MemoryCache()
+        self._async_wiki_http = async_wiki_http
+        self._owns_async_wiki_http = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def _async_http(self) -> AsyncWikiHttp:
+        """AsyncWikiHttp of the async methods. The one created here keeps its session (and connections) open
+        until aclose."""
+        if self._async_wiki_http is None:
+            self._async_wiki_http = await AsyncWikiHttp(url=getattr(self.wiki_http, 'url', None)).__aenter__()
+            self._owns_async_wiki_http = True
+        return self._async_wiki_http
+
+    async def aclose(self) -> None:
+        """Close the AsyncWikiHttp created by the service. A given async_wiki_http is closed by its owner."""
+        if self._owns_async_wiki_http:
+            await self._async_wiki_http.close()
+            self._async_wiki_http = None
+            self._owns_async_wiki_http = False
 
     @staticmethod
     def _normalized_words(words: list or str):
-        """Normalized words according to MediaWiki proposal:
+        """Normalized words according to MediaWiki proposal (see api/normalization.py):
             1. First letter is capital (First letter of a sentence, phrase of word. All others are up to the input
                 since MediaWiki is case sensitive)
-            2. Replace _ with white space
+            2. Replace _ with white space, collapse white space
             3. Trim both sides
+        Blank words are dropped, duplicates are removed keeping the order of words.
         """
-        normalized_words = []
-        words = [words] if type(words) != list else words
+        return normalize_titles(words)[0]
 
-        for word in words:
-            normalized_word = word.replace('_', ' ').strip()
-            normalized_word = normalized_word[0].capitalize() + normalized_word[1:]
-            if normalized_word not in normalized_words:
-                normalized_words.append(normalized_word)
+    @staticmethod
+    def normalize(words) -> tuple:
+        """Normalize words and return (titles, mapping), where mapping is {word: title} for every input word."""
+        return normalize_titles(words)
 
-        return normalized_words
+    @staticmethod
+    def resolve_titles(words, responses) -> dict:
+        """Map input words to canonical MediaWiki titles after the API applied normalization and redirects.
+            Args:
+                words: list of words as they were given to get_meanings_from_wiki
+                responses: responses returned by get_meanings_from_wiki (succeed + failed)
+            Returns:
+                dict {word: title}, title is None if there is no response for the word
+        """
+        titles = {response.title: response.title for response in responses}
+        titles.update((response.search_word, response.title) for response in responses
+                      if isinstance(response, SuccessfulResponse))
+
+        _, mapping = normalize_titles(words)
+        return {word: titles.get(title) for word, title in mapping.items()}
 
     def get_meanings_from_wiki(self, words):
         """Get response from MediaWiki and parse it. The proper result is uploaded to database.
             Args:
-                words: list of string to be search in MeadiWiki
+                words: list of string to be search in MeadiWiki (of any length, WikiHttp splits it into chunks)
+            Returns:
+                tuple of successful and failed responses: len(tuple) == 2
+        """
+        batch = self._fetch(WikiService._normalized_words(words))
+        return batch.responses(SuccessfulResponse), batch.responses(SuccessfulResponse, negate=True)
+
+    def _fetch(self, normalized_words: list) -> ResponseBatch:
+        """Request normalized words from MediaWiki and save the responses."""
+        batch = ResponseBatch()
+
+        # Chunks are saved as soon as they are received, while the rest of chunks is still being requested.
+        for js in self.wiki_http.iter_get(normalized_words):
+            start = len(batch)
+            extended = batch.extend(js)
+            self._save_rows(batch, start, extended)
+
+        return batch
+
+    def lookup_many(self, words) -> tuple:
+        """Get responses of words from the fastest tier that has them:
+            1. memory - MemoryCache of the service (no query at all)
+            2. database - tbl_wiki with aliases (SuccessfulResponse) and tbl_wiki_failed (failed responses)
+            3. network - the remaining words are requested from MediaWiki in chunks and saved
+        Responses found in the database or network are put into the memory cache.
+            Args:
+                words: list or str of words
+            Returns:
+                tuple (responses, stats):
+                    responses - list of responses in order of words, None for a blank word
+                    stats - dict {'memory', 'database', 'network', 'unresolved'}: number of unique titles
+                        answered by every tier ('unresolved' are titles without any response)
+        """
+        words = [words] if isinstance(words, str) else list(words)
+        titles, mapping = normalize_titles(words)
+
+        found = self.memory_cache.get_many(titles)
+        stats = {'memory': len(found), 'database': 0, 'network': 0, 'unresolved': 0}
+
+        for tier, lookup in (('database', self._lookup_database), ('network', self._lookup_network)):
+            remaining = [title for title in titles if title not in found]
+            if not remaining:
+                break
+
+            responses = lookup(remaining)
+            stats[tier] = len(responses)
+            found.update(responses)
+            self.memory_cache.put_many({title: response for title, response in responses.items()
+                                        if isinstance(response, SuccessfulResponse) or response.reason is not None})
+
+        stats['unresolved'] = len(titles) - len(found)
+        return [found.get(mapping.get(word)) for word in words], stats
+
+    def _lookup_database(self, titles: list) -> dict:
+        responses = {word: SuccessfulResponse(row.page_id, title=row.title, extract=row.meaning, searchword=word)
+                     for word, row in self.repo.resolve_search_words(titles).items()}
+
+        classes = {cls.reason: cls for cls in Response.response_classes() if cls.reason is not None}
+        remaining = [title for title in titles if title not in responses]
+        for word, row in self.repo.find_failed(remaining).items():
+            responses[word] = classes[row.reason](row.page_id, title=row.title)
+        return responses
+
+    def _lookup_network(self, titles: list) -> dict:
+        batch = self._fetch(titles)
+
+        # A title is answered by the page it is the search word or an alias (e.g. redirect) of.
+        responses = dict()
+        for i, response in enumerate(batch.responses()):
+            for name in (batch.search_words[i],) + batch.aliases[i]:
+                responses.setdefault(name, response)
+        return {title: responses[title] for title in titles if title in responses}
+
+    async def get_meanings_from_wiki_async(self, words):
+        """Async version of get_meanings_from_wiki. Words are requested by AsyncWikiHttp.
             Returns:
                 tuple of successful and failed responses: len(tuple) == 2
         """
         normalized_words = WikiService._normalized_words(words)
-
-        meanings = ResponseParser(self.wiki_http.get(normalized_words))
-        succeed = list(filter(lambda k: isinstance(k, SuccessfulResponse), meanings))
-        failed = list(filter(lambda k: not isinstance(k, SuccessfulResponse), meanings))
-        for meaning in succeed:
-            self.repo.insert(title=meaning.title, meaning=meaning.meaning,
-                             page_id=meaning.page_id, search_word=meaning.search_word)
-
-        return succeed, failed
+        async_wiki_http = await self._async_http()
+        batch = ResponseBatch(await async_wiki_http.get(normalized_words))
+        await asyncio.to_thread(self._save_rows, batch)
+
+        return batch.responses(SuccessfulResponse), batch.responses(SuccessfulResponse, negate=True)
+
+    def _save_rows(self, batch: ResponseBatch, start=0, extended=()) -> None:
+        """Upload successful responses of the batch (from index 'start') to database, map their other names
+        (redirects, titles) to them as aliases and remember missing, invalid and disambiguation responses
+        for failed_ttl seconds. Aliases of the earlier pages at indexes 'extended' (see ResponseBatch.extend)
+        are saved too. The three writes are committed together by the writer thread of the database."""
+        futures = [self.repo.insert_many(batch.rows(SuccessfulResponse, start=start), wait=False),
+                   self.repo.insert_aliases(batch.alias_rows(start=start, indexes=extended), wait=False),
+                   self.repo.insert_failed(batch.failed_rows(start), self.failed_ttl, wait=False)]
+        for future in futures:
+            future.result()
 
     def check_database(self, words) -> list:
-        """Check the list of words by search_word  the database and return those that are not listed."""
-        normalized_words = tuple(WikiService._normalized_words(words))
-        search_words = self.repo.find_by_search_word(normalized_words)
-        missing_words = list(set(normalized_words) - set(getattr(attr, 'search_word') for attr in search_words))
-        return missing_words
+        """Check the list of words by search_word  the database and return those that are not listed.
+        Aliases of stored pages (see Repository.insert_aliases) are listed. Words remembered as missing, invalid
+        or disambiguation (see failed_ttl) are treated as listed."""
+        return self.repo.missing_search_words(WikiService._normalized_words(words))
+
+    def ingest(self, words, batch_size=500, fetchers=2, queue_size=4, progress=None, job=None, resume=False) -> dict:
+        """Normalize words, drop those that are in the database, request the rest from MediaWiki and save them.
+        Stages run concurrently and are connected by bounded queues, so words can be an iterable of any size
+        (e.g. an open file). See api/ingest_pipeline.py.
+            Args:
+                words: iterable of str
+                batch_size: number of unique titles checked and requested together, default=500
+                fetchers: number of batches requested concurrently, default=2
+                queue_size: number of items a queue between two stages holds, default=4
+                progress: callable(stats, batch) called after every saved chunk, default=None
+                job: name of the job in the ingest journal, completed batches are checkpointed, default=None
+                resume: continue the job from its last checkpoint, the same words must be given, default=False
+            Returns:
+                dict: statistics of the ingest, 'stages' holds StageCounter (throughput) of every stage
+        """
+        words = [words] if isinstance(words, str) else words
+        return IngestPipeline(self, batch_size, fetchers, queue_size, progress, job, resume).run(words)
+
+    async def check_database_async(self, words) -> list:
+        """Async version of check_database, so that it can be awaited together with
+        get_meanings_from_wiki_async. The query runs in a worker thread, the event loop is not blocked."""
+        return await asyncio.to_thread(self.check_database, words)
 
 
 if __name__ == '__main__':
@@ -9,6 +9,9 @@ def _set_db_path():
 
 
 DB_PATH = _set_db_path()
+HTTP_CACHE_PATH = str(pathlib.Path(__file__).parent / 'repository/http_cache.db')
+HTTP_CACHE_TTL = 7 * 24 * 3600
+FAILED_RESPONSE_TTL = 30 * 24 * 3600    # Missing, invalid and disambiguation words are not requested for a month.
 
 if __name__ == '__main__':
     print(pathlib.Path(__file__).parent / 'repository/test_db.db')
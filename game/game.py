@@ -66,14 +66,17 @@ class Game:
 
         return questions
 
-    def write_statistics(self, correct_answers: int, time_spent) -> None:
-        """Write the result of the game into the database.
+    def write_statistics(self, correct_answers: int, time_spent):
+        """Write the result of the game into the database. The GUI does not wait for the write, it is committed
+        by the writer thread of the database together with other queued writes.
         Args:
             correct_answers: int, number of correct answers
             time_spent: float, time spent from the 1st question up to the last question.
+        Returns:
+            Future, resolved once the result is committed
         """
 
-        self.repo.insert_statistic(correct_answers, time_spent, self.questions)
+        return self.repo.insert_statistic(correct_answers, time_spent, self.questions, wait=False)
 
     @staticmethod
     def _build_question(title: str, meaning: str) -> str:
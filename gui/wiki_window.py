@@ -2,10 +2,11 @@ import tkinter as tk
 import tkinter.ttk as ttk
 import tkinter.messagebox as msg
 from api.wiki_service import WikiHttp, WikiService, Repository
+from api.response_cache import ResponseCache
 from os import name as os_name
 from gui.widgets.toggled_frame import ToggledFrame
 from gui.widgets.multi_listbox import MultiColumnListBox, RightClick
-from constants import DB_PATH
+from constants import DB_PATH, HTTP_CACHE_PATH, HTTP_CACHE_TTL
 
 
 class ListboxRightClick(RightClick):
@@ -54,6 +55,14 @@ class WikiMain(tk.Frame):
         self.btn_add = tk.Button(frame_top, text='Add', command=self.open_top_window)
         self.btn_add.pack(side=tk.RIGHT)
 
+        # Full-text search of titles, search words and meanings (Repository.search), best matches first.
+        self.btn_search = tk.Button(frame_top, text='Search', command=self._search)
+        self.btn_search.pack(side=tk.RIGHT, padx=5)
+
+        self.entry_search = ttk.Entry(frame_top)
+        self.entry_search.pack(side=tk.RIGHT, fill=tk.X, expand=True, padx=5)
+        self.entry_search.bind('<Return>', lambda _: self._search())
+
         self.tf = ToggledFrame(self, text='Filter', relief='raised', borderwidth=1)
         self._filter_entry()
         self.tf.pack(side=tk.TOP, fill=tk.X, pady=5, padx=5)
@@ -107,8 +116,27 @@ class WikiMain(tk.Frame):
             msg.showwarning('Warning', 'Please, select criteria and enter a value.')
         else:
             res = list(map(tuple, zip(*r)))
+            try:
+                rows = self.repo.filter_by(res[0], res[1], res[2], fetch='tuple')
+            except ValueError as e:     # e.g. a date that is not YYYY-MM-DD
+                msg.showwarning('Warning', str(e))
+                return
+
             self.listbox.tree.delete(*self.listbox.tree.get_children())
-            self.listbox.build_tree(self.repo.filter_by(res[0], res[1], res[2]))
+            self.listbox.build_tree(rows)
+
+    def _search(self):
+        """Fill the listbox with the best matches of the search entry, or with all rows if it is empty."""
+
+        text = self.entry_search.get().strip()
+        if not text:
+            self.update_listbox()
+            return
+
+        # Rows of search have 2 extra fields (score and snippet), the listbox shows the columns of tbl_wiki.
+        rows = self.repo.search(text, limit=500, fetch='tuple')
+        self.listbox.tree.delete(*self.listbox.tree.get_children())
+        self.listbox.build_tree([row[:len(WikiMain._COLUMN_NAMES)] for row in rows])
 
     def _clean_filter(self):
         """Clean all filtering criteria in widgets and reset listbox to 'find_all' state."""
@@ -123,7 +151,7 @@ class WikiMain(tk.Frame):
 
     def update_listbox(self):
         self.listbox.tree.delete(*self.listbox.tree.get_children())
-        self.listbox.build_tree(self.repo.find_all())
+        self.listbox.build_tree(self.repo.find_all(fetch='tuple'))
 
     def open_top_window(self):
 
@@ -176,17 +204,20 @@ class AddWindow(tk.Frame):
         if not len(self.notepad.get('1.0', 'end-1c').strip()):
             msg.showwarning("Error", "Please, enter a value!")
         else:
-            wiki_service = WikiService(wiki_http=WikiHttp(),
+            wiki_service = WikiService(wiki_http=WikiHttp(cache=ResponseCache(HTTP_CACHE_PATH, ttl=HTTP_CACHE_TTL)),
                                        repo=Repository(DB_PATH))
             words = [word for word in self.notepad.get('1.0', 'end-1c').split('\n') if len(word) > 0]
-            suc, failed = wiki_service.get_meanings_from_wiki(wiki_service.check_database(words))
-
-            if len(suc) > 0:
-                self.isAdded = True
 
             d = dict()
-            for cls in failed+suc:
-                d.setdefault(cls.__class__.__name__, []).append(getattr(cls, 'title'))
+
+            def collect(stats, batch):
+                for cls in batch.responses():
+                    d.setdefault(cls.__class__.__name__, []).append(getattr(cls, 'title'))
+
+            stats = wiki_service.ingest(words, progress=collect)
+
+            if stats['succeed'] > 0:
+                self.isAdded = True
 
             self.listbox.build_tree_from_dict(d)
 
@@ -0,0 +1,67 @@
+#!repository/bloom_filter.py Python3
+"""
+This module contains BloomFilter, a compact in-memory set of strings with no false negatives.
+Repository uses it to answer "this search word is definitely not in tbl_wiki" without querying SQLite.
+
+A word that is not in the filter was never added. A word that is in the filter was probably added:
+the probability of a false positive is about 'error_rate' while the filter holds up to 'capacity' words.
+
+Example:
+    bloom = BloomFilter(capacity=100000, error_rate=0.01)
+    bloom.update(['Python', 'Algebra'])
+    'Python' in bloom   # True
+    'Finance' in bloom  # False (or True with probability ~1%)
+"""
+import hashlib
+import math
+
+
+class BloomFilter:
+    """Bloom filter of strings.
+    Args:
+        capacity: expected number of words, default=100000
+        error_rate: probability of a false positive at full capacity, default=0.01
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.01):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def __repr__(self):
+        return '{}(count={}, capacity={}, size={} bits, hashes={})'.format(
+            self.__class__.__name__, self.count, self.capacity, self.size, self.hashes)
+
+    def __len__(self):
+        return self.count
+
+    def _positions(self, word: str):
+        """k positions from two 64-bit hashes (double hashing)."""
+        digest = int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=16).digest(), 'little')
+        h1, h2 = digest & 0xFFFFFFFFFFFFFFFF, (digest >> 64) | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, word: str) -> None:
+        for position in self._positions(word):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, words) -> None:
+        for word in words:
+            self.add(word)
+
+    def __contains__(self, word: str) -> bool:
+        # Stops at the first unset bit, so most of the absent words cost one or two checks.
+        bits = self.bits
+        for position in self._positions(word):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def is_full(self) -> bool:
+        """True if more words were added than the capacity, so the error rate is higher than expected."""
+        return self.count > self.capacity
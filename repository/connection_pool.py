@@ -0,0 +1,148 @@
+#!repository/connection_pool.py Python3
+"""
+This module contains ConnectionPool, the process-wide pool of SQLite connections behind Repository.
+
+There is one pool per database file (ConnectionPool.get), no matter how many Repository objects are created for it
+(the GUI windows, the game and WikiService all create their own). Every thread gets its own connection and cursor,
+created on first use and reused afterwards, since a SQLite connection must not be shared between threads.
+
+Every connection is tuned the same way:
+    journal_mode=WAL: readers never block behind a writer (e.g. the GUI while an ingest is running)
+    synchronous=NORMAL: in WAL mode the database stays consistent, only the last commits can be lost on power loss
+    cache_size=64 MB, mmap_size=256 MB: hot pages are read from memory
+    temp_store=MEMORY: temporary tables (see Repository.missing_search_words) and indexes are kept in memory
+    busy timeout 5 s: a writer waits for the lock instead of failing with 'database is locked'
+    foreign_keys=ON: it is a per connection setting in SQLite
+
+All writes go through one writer thread per database (ConnectionPool.writer, see repository/group_writer.py),
+which commits them in groups.
+
+':memory:' databases get their own pool every time, with a shared in-memory database, so that all threads of
+a Repository see the same data. Its connections read uncommitted data, otherwise a reader would fail with
+'database table is locked' while the writer holds a transaction open.
+
+Example:
+    pool = ConnectionPool.get('repository/test_db.db', on_create=create_schema)
+    pool.cursor().execute('SELECT COUNT(*) FROM tbl_wiki')
+"""
+import atexit
+import itertools
+import sqlite3
+import threading
+from repository.group_writer import GroupWriter
+
+
+class ConnectionPool:
+    """Per-thread connections to one SQLite database.
+    Args:
+        db_path: str, path of the database file or ':memory:'
+        on_create: callable(connection), called once with the first connection (e.g. to create the schema)
+        on_connect: callable(connection), called with every new connection (e.g. to set row_factory)
+    """
+
+    PRAGMAS = {'journal_mode': 'WAL',
+               'synchronous': 'NORMAL',
+               'cache_size': -64 * 1024,        # KiB
+               'mmap_size': 256 * 1024 * 1024,  # bytes
+               'temp_store': 'MEMORY',
+               'foreign_keys': 'ON'}
+    BUSY_TIMEOUT = 5.0
+
+    _pools = dict()
+    _pools_lock = threading.Lock()
+    _memory_ids = itertools.count()
+
+    @staticmethod
+    def get(db_path: str, on_create=None, on_connect=None):
+        """Return the pool of the database, create it on first call. ':memory:' always gets a new pool."""
+        if db_path == ':memory:':
+            return ConnectionPool(db_path, on_create, on_connect)
+
+        with ConnectionPool._pools_lock:
+            pool = ConnectionPool._pools.get(db_path)
+            if pool is None:
+                pool = ConnectionPool._pools[db_path] = ConnectionPool(db_path, on_create, on_connect)
+            return pool
+
+    def __init__(self, db_path: str, on_create=None, on_connect=None):
+        self.db_path = db_path
+        self.on_connect = on_connect
+        self.shared = dict()    # state of the database shared by all its Repository objects (e.g. Bloom filter)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = dict()     # thread: its connection
+        self._writer = None
+
+        if db_path == ':memory:':
+            self._uri = 'file:wikibase_memory_{}?mode=memory&cache=shared'.format(next(ConnectionPool._memory_ids))
+        else:
+            self._uri = None
+
+        # The first connection creates the schema. For ':memory:' it also keeps the shared database alive.
+        connection = self.connection()
+        if on_create is not None:
+            on_create(connection)
+
+    def __repr__(self):
+        return '{}({!r}, connections={})'.format(self.__class__.__name__, self.db_path, len(self._connections))
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._uri is not None:
+            connection = sqlite3.connect(self._uri, uri=True, timeout=ConnectionPool.BUSY_TIMEOUT,
+                                         check_same_thread=False)
+        else:
+            connection = sqlite3.connect(self.db_path, timeout=ConnectionPool.BUSY_TIMEOUT, check_same_thread=False)
+
+        for pragma, value in ConnectionPool.PRAGMAS.items():
+            if self._uri is not None and pragma in ('journal_mode', 'mmap_size'):
+                continue
+            connection.execute('PRAGMA {} = {}'.format(pragma, value))
+        if self._uri is not None:
+            connection.execute('PRAGMA read_uncommitted = ON')
+
+        if self.on_connect is not None:
+            self.on_connect(connection)
+
+        with self._lock:
+            # Connections of finished threads are closed, so short-lived threads do not leak them.
+            for thread in [thread for thread in self._connections if not thread.is_alive()]:
+                self._connections.pop(thread).close()
+            self._connections[threading.current_thread()] = connection
+        return connection
+
+    def connection(self) -> sqlite3.Connection:
+        """Connection of the current thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+            self._local.cursor = connection.cursor()
+        return connection
+
+    def cursor(self) -> sqlite3.Cursor:
+        """Cursor of the connection of the current thread."""
+        self.connection()
+        return self._local.cursor
+
+    @property
+    def writer(self) -> GroupWriter:
+        """Writer thread of the database, started on first use."""
+        with self._lock:
+            if self._writer is None:
+                self._writer = GroupWriter(self)
+                atexit.register(self._writer.close)
+            return self._writer
+
+    def close(self) -> None:
+        """Commit queued writes, close all connections of the pool and remove it from the registry."""
+        if self._writer is not None:
+            self._writer.close()
+
+        with ConnectionPool._pools_lock:
+            if ConnectionPool._pools.get(self.db_path) is self:
+                del ConnectionPool._pools[self.db_path]
+
+        with self._lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
@@ -1,7 +1,14 @@
 import sqlite3
 import logging
+import re
+import datetime
+import threading
 from constants import DB_PATH
 from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+from repository.bloom_filter import BloomFilter
+from repository.connection_pool import ConnectionPool
 
 logger = logging.getLogger('repository.db_setup')
 formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
@@ -17,30 +24,114 @@ logger.addHandler(stream_handler)
 
 class Repository:
 
-    _FILTER_CRITERIA = {'Is equal to': "='{}'",
-                        'Is not equal to': "!='{}'",
-                        'Starts with': "LIKE '{}%'",
-                        'Does not contain': "NOT LIKE '%{}%'",
-                        'Contains': "LIKE '%{}%'",
-                        'Ends with': "LIKE '%{}'",
-                        'Greater': ">'{}'",
-                        'Greater or equal to': ">='{}'",
-                        'Less': "<'{}'",
-                        'Less or equal to': "<='{}'"}
-
-    def __init__(self, db_path=':memory:'):
+    _FILTER_FIELDS = ('tbl_id', 'page_id', 'title', 'search_word', 'meaning', 'created_date')
+
+    # Conditions of filter_by, {0} is the field, values are bound parameters (see _filter_params).
+    # 'Starts with' is a range of the NOCASE indexes (idx_wiki_*_nocase), LIKE only checks the rows of the range.
+    _FILTER_CRITERIA = {'Is equal to': "{0} = ? COLLATE NOCASE AND {0} = ?",
+                        'Is not equal to': "{0} != ?",
+                        'Starts with': "{0} >= ? COLLATE NOCASE AND {0} < ? COLLATE NOCASE AND {0} LIKE ? ESCAPE '\\'",
+                        'Does not contain': "{0} NOT LIKE ? ESCAPE '\\'",
+                        'Contains': "{0} LIKE ? ESCAPE '\\'",
+                        'Ends with': "{0} LIKE ? ESCAPE '\\'",
+                        'Greater': "{0} > ?",
+                        'Greater or equal to': "{0} >= ?",
+                        'Less': "{0} < ?",
+                        'Less or equal to': "{0} <= ?"}
+
+    # created_date is a timestamp ('YYYY-MM-DD HH:MM:SS'), a date is the range [day, next day) of it,
+    # so the conditions are ranges of idx_wiki_created_date instead of date(created_date) of every row.
+    _DATE_CRITERIA = {'Is equal to': ("{0} >= ? AND {0} < ?", ('day', 'next_day')),
+                      'Is not equal to': ("({0} < ? OR {0} >= ?)", ('day', 'next_day')),
+                      'Greater': ("{0} >= ?", ('next_day',)),
+                      'Greater or equal to': ("{0} >= ?", ('day',)),
+                      'Less': ("{0} < ?", ('day',)),
+                      'Less or equal to': ("{0} < ?", ('next_day',))}
+
+    # Substring criteria answered by the trigram index (tbl_wiki_trigram) instead of a LIKE scan of tbl_wiki.
+    # 'Does not contain' stays a scan: it matches most of the rows, an index can not narrow them down.
+    # The trigram index is not used for LIKE with ESCAPE, so it is only used for values without wildcards.
+    _TRIGRAM_CRITERIA = {'Contains': "tbl_id IN (SELECT rowid FROM tbl_wiki_trigram WHERE {0} LIKE ?)",
+                         'Ends with': "tbl_id IN (SELECT rowid FROM tbl_wiki_trigram WHERE {0} LIKE ?)"}
+    _SEARCH_COLUMNS = ('title', 'search_word', 'meaning')
+
+    # Upsert of Repository.insert_many as an insert of new pages and an update of the stored ones.
+    # INSERT ... ON CONFLICT would take an AUTOINCREMENT id for every conflicting row, leaving gaps in tbl_id.
+    _INSERT_NEW = """
+        INSERT INTO tbl_wiki(page_id, title, meaning, search_word) SELECT ?1, ?2, ?3, ?4
+        WHERE NOT EXISTS (SELECT 1 FROM tbl_wiki WHERE page_id = ?1);
+        """
+    # A row equal to the stored one is not changed.
+    _UPDATE_STORED = """
+        UPDATE tbl_wiki SET title = ?2, meaning = IFNULL(?3, meaning)
+        WHERE page_id = ?1 AND (title IS NOT ?2 OR meaning IS NOT IFNULL(?3, meaning));
+        """
+
+    # Sources of the Bloom filter: (table, rowid, search word). Search words are never updated, only inserted:
+    # new rows of tbl_wiki get ids above all previous ones (AUTOINCREMENT) and new rows of tbl_wiki_alias
+    # and tbl_wiki_failed (INSERT OR REPLACE too) a rowid above the current last one.
+    _BLOOM_SOURCES = (('tbl_wiki', 'tbl_id', 'search_word'), ('tbl_wiki_alias', 'rowid', 'alias'),
+                      ('tbl_wiki_failed', 'rowid', 'search_word'))
+
+    # Exact match of title or search_word {0} and value {1}: the NOCASE term finds the candidates by the NOCASE index,
+    # the BINARY term keeps the exact ones. Other fields are compared as they are.
+    _EXACT_MATCH = '{0} = {1} COLLATE NOCASE AND {0} = {1}'
+
+    _MAX_VARIABLES = 999    # Default SQLITE_MAX_VARIABLE_NUMBER of SQLite before 3.32.
+
+    # Shapes of results of the find/filter methods:
+    #   namedtuple - list of Row namedtuples (access by attribute), the row class is created once per columns
+    #   tuple - list of plain tuples, the fastest, e.g. for widgets that take sequences
+    #   columns - dict {column: list of values}, for bulk consumers
+    _FETCH_MODES = ('namedtuple', 'tuple', 'columns')
+
+    def __init__(self, db_path=':memory:', fetch='namedtuple'):
+        if fetch not in Repository._FETCH_MODES:
+            raise ValueError('Incorrect fetch mode: {}'.format(fetch))
+        self.fetch = fetch
+
         try:
-            self.connection = sqlite3.connect(db_path)
+            self.pool = ConnectionPool.get(db_path, on_create=Repository._create_schema,
+                                           on_connect=Repository._configure)
         except sqlite3.OperationalError as e:
             logger.exception(e)
             raise
 
-        self.connection.row_factory = Repository._namedtuple_factory
-        self.cursor = self.connection.cursor()
+    @property
+    def full_text(self) -> bool:
+        """True if the full-text indexes exist (SQLite with FTS5)."""
+        if 'full_text' not in self.pool.shared:
+            count = self._plain_cursor().execute("SELECT COUNT(*) FROM sqlite_master "
+                                                 "WHERE name IN ('tbl_wiki_fts', 'tbl_wiki_trigram')").fetchone()[0]
+            self.pool.shared['full_text'] = count == 2
+        return self.pool.shared['full_text']
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Connection of the current thread (see repository/connection_pool.py)."""
+        return self.pool.connection()
+
+    @property
+    def cursor(self) -> sqlite3.Cursor:
+        """Cursor of the current thread."""
+        return self.pool.cursor()
+
+    @property
+    def bloom(self):
+        """BloomFilter of the database, shared by all Repository objects of the same database."""
+        return self.pool.shared.get('bloom')
+
+    @bloom.setter
+    def bloom(self, bloom) -> None:
+        self.pool.shared['bloom'] = bloom
 
-        self.cursor.executescript("""
-                                PRAGMA foreign_keys = ON;
-                                
+    @staticmethod
+    def _configure(connection: sqlite3.Connection) -> None:
+        connection.row_factory = Repository._namedtuple_factory
+
+    @staticmethod
+    def _create_schema(connection: sqlite3.Connection) -> None:
+        connection.executescript("""
                                 CREATE TABLE IF NOT EXISTS tbl_wiki (
                                 tbl_id INTEGER PRIMARY KEY AUTOINCREMENT, 
                                 page_id INTEGER UNIQUE CHECK(TYPEOF(page_id) = 'integer' AND page_id >= 0), 
@@ -48,7 +139,34 @@ class Repository:
                                 search_word TEXT, 
                                 meaning TEXT,
                                 created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+
+                                -- Indexes of filter_by. They cover all filter fields but meaning, so conditions
+                                -- on the other fields are checked in the index, before rows are read.
+                                -- Exact lookups of title and search_word use the NOCASE indexes as well
+                                -- (see _EXACT_MATCH): separate BINARY indexes cost 20-35% of the upsert rate.
+                                CREATE INDEX IF NOT EXISTS idx_wiki_title_nocase
+                                ON tbl_wiki(title COLLATE NOCASE, search_word, created_date);
+                                CREATE INDEX IF NOT EXISTS idx_wiki_search_word_nocase
+                                ON tbl_wiki(search_word COLLATE NOCASE, title, created_date);
+                                CREATE INDEX IF NOT EXISTS idx_wiki_created_date
+                                ON tbl_wiki(created_date, title, search_word);
+
+                                CREATE TABLE IF NOT EXISTS tbl_wiki_alias (
+                                alias TEXT PRIMARY KEY,
+                                wiki_id INTEGER NOT NULL,
+                                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                FOREIGN KEY(wiki_id) REFERENCES tbl_wiki(tbl_id) ON DELETE CASCADE);
+
+                                CREATE INDEX IF NOT EXISTS idx_wiki_alias_wiki_id ON tbl_wiki_alias(wiki_id);
                                 
+                                CREATE TABLE IF NOT EXISTS tbl_wiki_failed (
+                                search_word TEXT PRIMARY KEY,
+                                title TEXT,
+                                page_id INTEGER,
+                                reason TEXT NOT NULL CHECK(reason IN ('missing', 'invalid', 'disambiguation')),
+                                expires_at TIMESTAMP NOT NULL,
+                                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+
                                 CREATE TABLE IF NOT EXISTS tbl_wiki_meaning (
                                 tbl_id INTEGER PRIMARY KEY AUTOINCREMENT, 
                                 wiki_id INTEGER, 
@@ -56,6 +174,23 @@ class Repository:
                                 created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP, 
                                 FOREIGN KEY(wiki_id) REFERENCES tbl_wiki(tbl_id) ON DELETE CASCADE);
                                 
+                                CREATE TABLE IF NOT EXISTS tbl_ingest_job (
+                                job TEXT PRIMARY KEY,
+                                batch_size INTEGER NOT NULL CHECK(batch_size > 0),
+                                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                finished_date TIMESTAMP);
+
+                                CREATE TABLE IF NOT EXISTS tbl_ingest_journal (
+                                job TEXT NOT NULL,
+                                batch_no INTEGER NOT NULL,
+                                known INTEGER NOT NULL,
+                                succeed INTEGER NOT NULL,
+                                failed INTEGER NOT NULL,
+                                written INTEGER NOT NULL,
+                                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                PRIMARY KEY(job, batch_no),
+                                FOREIGN KEY(job) REFERENCES tbl_ingest_job(job) ON DELETE CASCADE);
+
                                 CREATE TABLE IF NOT EXISTS game_stat (
                                 tbl_id INTEGER PRIMARY KEY AUTOINCREMENT, 
                                 correct_answers INTEGER, 
@@ -64,85 +199,636 @@ class Repository:
                                 created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
 
                                 """)
+        Repository._create_search_index(connection)
+
+    # Triggers that keep the full-text indexes in sync with tbl_wiki (see _create_search_index).
+    _SEARCH_TRIGGERS = {'trg_wiki_fts_insert': """
+                                CREATE TRIGGER IF NOT EXISTS trg_wiki_fts_insert AFTER INSERT ON tbl_wiki BEGIN
+                                    INSERT INTO tbl_wiki_fts(rowid, title, search_word, meaning)
+                                    VALUES(new.tbl_id, new.title, new.search_word, new.meaning);
+                                    INSERT INTO tbl_wiki_trigram(rowid, title, search_word)
+                                    VALUES(new.tbl_id, new.title, new.search_word);
+                                END;""",
+                        'trg_wiki_fts_delete': """
+                                CREATE TRIGGER IF NOT EXISTS trg_wiki_fts_delete AFTER DELETE ON tbl_wiki BEGIN
+                                    INSERT INTO tbl_wiki_fts(tbl_wiki_fts, rowid, title, search_word, meaning)
+                                    VALUES('delete', old.tbl_id, old.title, old.search_word, old.meaning);
+                                    INSERT INTO tbl_wiki_trigram(tbl_wiki_trigram, rowid, title, search_word)
+                                    VALUES('delete', old.tbl_id, old.title, old.search_word);
+                                END;""",
+                        'trg_wiki_fts_update': """
+                                CREATE TRIGGER IF NOT EXISTS trg_wiki_fts_update
+                                AFTER UPDATE OF title, search_word, meaning ON tbl_wiki BEGIN
+                                    INSERT INTO tbl_wiki_fts(tbl_wiki_fts, rowid, title, search_word, meaning)
+                                    VALUES('delete', old.tbl_id, old.title, old.search_word, old.meaning);
+                                    INSERT INTO tbl_wiki_fts(rowid, title, search_word, meaning)
+                                    VALUES(new.tbl_id, new.title, new.search_word, new.meaning);
+                                    INSERT INTO tbl_wiki_trigram(tbl_wiki_trigram, rowid, title, search_word)
+                                    VALUES('delete', old.tbl_id, old.title, old.search_word);
+                                    INSERT INTO tbl_wiki_trigram(rowid, title, search_word)
+                                    VALUES(new.tbl_id, new.title, new.search_word);
+                                END;"""}
 
     @staticmethod
-    def _namedtuple_factory(cursor, row) -> namedtuple:
-        fields = [col[0] for col in cursor.description]
-        Row = namedtuple("Row", fields)
-        return Row(*row)
+    def _create_search_index(connection: sqlite3.Connection) -> None:
+        """Create full-text indexes of tbl_wiki, kept in sync with it by triggers:
+            tbl_wiki_fts - words of title, search_word and meaning (unicode61),
+                           for ranked search (see search)
+            tbl_wiki_trigram - trigrams of title and search_word, for substring filters (see filter_by)
+        Both are external content tables: they index tbl_wiki without keeping a copy of its text.
+        Indexes created for an existing database, or whose triggers are missing (a bulk load that did not finish,
+        see deferred_search_index), are filled from tbl_wiki once.
+        SQLite without FTS5 (or older than 3.34 for trigrams) works without them, filters fall back to LIKE."""
+        exists = connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'tbl_wiki_fts'").fetchone()
+        triggers = connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN ({})"
+                                      .format(','.join('?' * len(Repository._SEARCH_TRIGGERS))),
+                                      tuple(Repository._SEARCH_TRIGGERS)).fetchone()[0]
 
-    def _find_by(self, field: str, values: tuple) -> list:
-        r = self.cursor.execute(f"SELECT * FROM tbl_wiki WHERE {field} IN ({','.join(['?']*len(values))})", values)
-        res = r.fetchall()
-        return res
+        try:
+            connection.executescript("""
+                                CREATE VIRTUAL TABLE IF NOT EXISTS tbl_wiki_fts USING fts5(
+                                title, search_word, meaning,
+                                content='tbl_wiki', content_rowid='tbl_id',
+                                tokenize='unicode61 remove_diacritics 2');
+
+                                CREATE VIRTUAL TABLE IF NOT EXISTS tbl_wiki_trigram USING fts5(
+                                title, search_word,
+                                content='tbl_wiki', content_rowid='tbl_id',
+                                tokenize='trigram');
+                                """ + ''.join(Repository._SEARCH_TRIGGERS.values()))
+        except sqlite3.OperationalError as e:
+            logger.warning('Full-text search is not available: {}'.format(e))
+            return
 
-    def insert(self, title: str, meaning: str, search_word=None, page_id=None) -> None:
+        if exists is None:
+            # Ranking of search: a match in the title weighs the most, a match in the meaning the least.
+            connection.execute("INSERT INTO tbl_wiki_fts(tbl_wiki_fts, rank) VALUES('rank', 'bm25(10.0, 5.0, 1.0)')")
+        if exists is None or triggers < len(Repository._SEARCH_TRIGGERS):
+            Repository._rebuild_search_index(connection)
+        connection.commit()
 
-        if search_word is None:
-            search_word = title
+    @staticmethod
+    def _rebuild_search_index(connection: sqlite3.Connection) -> None:
+        """Fill the full-text indexes from tbl_wiki, one pass instead of a trigger per row."""
+        connection.execute("INSERT INTO tbl_wiki_fts(tbl_wiki_fts) VALUES('rebuild')")
+        connection.execute("INSERT INTO tbl_wiki_trigram(tbl_wiki_trigram) VALUES('rebuild')")
 
+    @staticmethod
+    def _drop_search_triggers(connection: sqlite3.Connection) -> None:
+        for name in Repository._SEARCH_TRIGGERS:
+            connection.execute('DROP TRIGGER IF EXISTS {}'.format(name))
+
+    @staticmethod
+    def _restore_search_triggers(connection: sqlite3.Connection) -> None:
+        for sql in Repository._SEARCH_TRIGGERS.values():
+            connection.execute(sql)
+        Repository._rebuild_search_index(connection)
+
+    @contextmanager
+    def deferred_search_index(self):
+        """Context manager for bulk loads (see repository/dump_import.py): the triggers of the full-text indexes
+        are dropped and the indexes are rebuilt from tbl_wiki once at the end, which is several times faster
+        than updating them row by row. Meanwhile search and filter_by fall back to LIKE, the indexes would miss
+        the new rows. If the process stops before the end, the indexes are rebuilt when the database is opened."""
+        shared = self.pool.shared
+        if not self.full_text and not shared.get('deferred_search_index'):
+            yield
+            return
+
+        # Nested and concurrent loads of the database share one deferral, the last one restores the triggers.
+        lock = shared.setdefault('deferred_search_index_lock', threading.Lock())
+        with lock:
+            shared['deferred_search_index'] = shared.get('deferred_search_index', 0) + 1
+            if shared['deferred_search_index'] == 1:
+                self._write(Repository._drop_search_triggers)
+                shared['full_text'] = False
+        try:
+            yield
+        finally:
+            with lock:
+                shared['deferred_search_index'] -= 1
+                if not shared['deferred_search_index']:
+                    self._write(Repository._restore_search_triggers)
+                    shared['full_text'] = True
+
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _row_class(fields: tuple) -> type:
+        """Row namedtuple class of the columns. Creating a namedtuple class is expensive, so it is done once."""
+        return namedtuple("Row", fields, rename=True)
+
+    @staticmethod
+    def _namedtuple_factory(cursor, row) -> namedtuple:
+        return Repository._row_class(tuple(col[0] for col in cursor.description))._make(row)
+
+    def _shape(self, description, rows: list, fetch=None):
+        """Convert plain rows into the fetch mode (default of the repository if fetch is None)."""
+        fetch = fetch or self.fetch
+        if fetch == 'tuple':
+            return rows
+
+        fields = tuple(col[0] for col in description)
+        if fetch == 'namedtuple':
+            return list(map(Repository._row_class(fields)._make, rows))
+        if fetch == 'columns':
+            columns = zip(*rows) if rows else [()] * len(fields)
+            return {field: list(column) for field, column in zip(fields, columns)}
+
+        raise ValueError('Incorrect fetch mode: {}'.format(fetch))
+
+    def _select(self, sql: str, params=(), fetch=None):
+        """Execute a SELECT and return all rows in the fetch mode."""
+        cursor = self._plain_cursor().execute(sql, params)
+        return self._shape(cursor.description, cursor.fetchall(), fetch)
+
+    def _find_by(self, field: str, values: tuple, fetch=None):
+        # Values are split into chunks, so that the number of placeholders never exceeds the SQLite limit.
+        cursor = self._plain_cursor().execute('SELECT * FROM tbl_wiki LIMIT 0')
+        res = []
+        for i in range(0, len(values), Repository._MAX_VARIABLES):
+            chunk = values[i:i + Repository._MAX_VARIABLES]
+            placeholders = ','.join('?{}'.format(n) for n in range(1, len(chunk) + 1))
+            if field in ('title', 'search_word'):
+                # Numbered parameters are bound once for both terms (see _EXACT_MATCH).
+                condition = f"{field} COLLATE NOCASE IN ({placeholders}) AND {field} IN ({placeholders})"
+            else:
+                condition = f"{field} IN ({placeholders})"
+            cursor.execute(f"SELECT * FROM tbl_wiki WHERE {condition}", chunk)
+            res.extend(cursor.fetchall())
+        return self._shape(cursor.description, res, fetch)
+
+    def enable_bloom_filter(self, error_rate=0.01) -> BloomFilter:
+        """Build an in-memory Bloom filter of all search words (of tbl_wiki, tbl_wiki_alias and tbl_wiki_failed).
+        Then missing_search_words answers most words that are not in the database without a query.
+
+        Before every use the filter is synced with the rows that were added since (see _sync_bloom), by any
+        Repository object, connection or process, and it is rebuilt when it outgrows its capacity.
+        Deleted words stay in the filter: they are only false positives, which are checked by the query anyway."""
+        with self.pool.shared.setdefault('bloom_lock', threading.Lock()):
+            return self._build_bloom(error_rate)
+
+    def _build_bloom(self, error_rate) -> BloomFilter:
+        cursor = self._plain_cursor()
+        count = cursor.execute('SELECT (SELECT COUNT(*) FROM tbl_wiki) + (SELECT COUNT(*) FROM tbl_wiki_alias) '
+                               '+ (SELECT COUNT(*) FROM tbl_wiki_failed)').fetchone()[0]
+        bloom = BloomFilter(capacity=max(2 * count, 10000), error_rate=error_rate)
+        self.pool.shared['bloom_marks'] = self._fill_bloom(bloom, (0,) * len(Repository._BLOOM_SOURCES))
+        self.bloom = bloom
+        return bloom
+
+    def _fill_bloom(self, bloom: BloomFilter, marks: tuple) -> tuple:
+        """Add the search words of the rows above marks (last rowid of each source) and return the new marks."""
+        cursor = self._plain_cursor()
+        new_marks = []
+        for (table, rowid, word), mark in zip(Repository._BLOOM_SOURCES, marks):
+            for row_id, search_word in cursor.execute(
+                    f'SELECT {rowid}, {word} FROM {table} WHERE {rowid} > ? AND {word} IS NOT NULL', (mark,)):
+                bloom.add(search_word)
+                mark = row_id
+            new_marks.append(mark)
+        return tuple(new_marks)
+
+    def _sync_bloom(self) -> BloomFilter:
+        """Add the rows that were added since the last sync to the Bloom filter and return it.
+        If the last rows of tbl_wiki_alias or tbl_wiki_failed were deleted, their rowids may be given to new rows,
+        which the marks would miss, so the filter is rebuilt (as when it is full). A change of another process
+        between two syncs that deletes the last rows and then adds at least as many rows can still be missed:
+        its new words are then reported missing, i.e. looked up again, until the filter is rebuilt."""
+        shared = self.pool.shared
+        with shared.setdefault('bloom_lock', threading.Lock()):
+            bloom, marks = shared['bloom'], shared['bloom_marks']
+            last = self._plain_cursor().execute(
+                'SELECT ' + ', '.join(f'IFNULL((SELECT MAX({rowid}) FROM {table}), 0)'
+                                      for table, rowid, _ in Repository._BLOOM_SOURCES)).fetchone()
+            if any(last[i] < marks[i] for i in range(1, len(marks))):
+                return self._build_bloom(bloom.error_rate)
+            if last != marks:
+                shared['bloom_marks'] = self._fill_bloom(bloom, marks)
+                if bloom.is_full:
+                    return self._build_bloom(bloom.error_rate)
+            return bloom
+
+    def _plain_cursor(self) -> sqlite3.Cursor:
+        """Cursor that returns plain tuples, for internal queries that do not need named rows."""
+        cursor = self.connection.cursor()
+        cursor.row_factory = None
+        return cursor
+
+    def _query_search_words(self, search_words, sql: str, cursor=None) -> list:
+        """Load search words into the temporary table tmp_search_word and return all rows of sql that joins it."""
+        cursor = cursor or self._plain_cursor()
         try:
             self.cursor.execute('BEGIN')
-            self.cursor.execute('INSERT INTO tbl_wiki(page_id, title, meaning, search_word) '
-                                'VALUES(?, ?, ?, ?)', (page_id, title, meaning, search_word))
+            self.cursor.execute('CREATE TEMP TABLE IF NOT EXISTS tmp_search_word (search_word TEXT PRIMARY KEY)')
+            self.cursor.execute('DELETE FROM tmp_search_word')
+            self.cursor.executemany('INSERT OR IGNORE INTO tmp_search_word(search_word) VALUES(?)',
+                                    ((word,) for word in search_words))
+            rows = cursor.execute(sql).fetchall()
+            self.cursor.execute('DELETE FROM tmp_search_word')
             self.cursor.execute('COMMIT')
 
         except self.connection.Error:
             self.cursor.execute('ROLLBACK')
             logger.exception("Exception occurred")
+            raise
 
-    def delete(self, _id: tuple) -> None:
-        self.cursor.execute(f"DELETE FROM tbl_wiki WHERE tbl_id IN ({','.join(['?']*len(_id))})", _id)
-        self.connection.commit()
+        return rows
+
+    def missing_search_words(self, search_words, include_failed=True) -> list:
+        """Return search words that are neither in tbl_wiki nor aliases in tbl_wiki_alias, in the given order.
+        If include_failed is True, words with an unexpired entry in tbl_wiki_failed are not returned either.
+        Words are loaded into a temporary table and anti-joined with the tables by their indexes,
+        so only the missing words are returned. Words rejected by the Bloom filter are not queried at all."""
+        search_words = list(dict.fromkeys(search_words))
+        if self.bloom is not None:
+            bloom = self._sync_bloom()
+            candidates = [word for word in search_words if word in bloom]
+        else:
+            candidates = search_words
+
+        sql = ('SELECT t.search_word FROM tmp_search_word t '
+               'WHERE EXISTS (SELECT 1 FROM tbl_wiki w WHERE '
+               + Repository._EXACT_MATCH.format('w.search_word', 't.search_word') + ') '
+               'OR EXISTS (SELECT 1 FROM tbl_wiki_alias a WHERE a.alias = t.search_word)')
+        if include_failed:
+            sql += (' OR EXISTS (SELECT 1 FROM tbl_wiki_failed f '
+                    "WHERE f.search_word = t.search_word AND f.expires_at > datetime('now'))")
+
+        found = set(row[0] for row in self._query_search_words(candidates, sql))
+        return [word for word in search_words if word not in found]
+
+    def resolve_search_words(self, search_words) -> dict:
+        """Return {search_word: row of tbl_wiki} for the search words that are stored, directly or as an alias.
+        Rows have an extra first field 'word', the search word they were found by."""
+        rows = self._query_search_words(search_words, """
+        SELECT t.search_word word, w.* FROM tmp_search_word t JOIN tbl_wiki w ON """
+        + Repository._EXACT_MATCH.format('w.search_word', 't.search_word') + """
+        UNION ALL
+        SELECT t.search_word word, w.* FROM tmp_search_word t
+            JOIN tbl_wiki_alias a ON a.alias = t.search_word
+            JOIN tbl_wiki w ON w.tbl_id = a.wiki_id;
+        """, self.connection.cursor())
+
+        resolved = dict()
+        for row in rows:
+            resolved.setdefault(row.word, row)
+        return resolved
+
+    def _write(self, operation, *args, rows=1, wait=True):
+        """Submit operation(connection, *args) to the writer thread of the database (see repository/group_writer.py).
+        Returns the result of the operation once it is committed, or its Future if wait is False."""
+        future = self.pool.writer.submit(operation, *args, rows=rows)
+        return future.result() if wait else future
+
+    def flush(self) -> None:
+        """Wait until all writes submitted so far (e.g. with wait=False) are committed."""
+        self.pool.writer.flush()
+
+    def insert_aliases(self, rows, wait=True) -> int:
+        """Map aliases to stored pages: rows (alias, page_id) are inserted into tbl_wiki_alias.
+        An alias that is the search_word of its page, an alias that exists already and an alias of a page that is
+        not stored are ignored.
+        Returns:
+            int: number of inserted aliases (Future of it if wait is False)
+        """
+        rows = list(rows)
+        return self._write(self._insert_aliases, rows, rows=len(rows), wait=wait)
+
+    def _insert_aliases(self, connection: sqlite3.Connection, rows: list) -> int:
+        try:
+            inserted = connection.executemany('INSERT OR IGNORE INTO tbl_wiki_alias(alias, wiki_id) '
+                                              'SELECT ?1, tbl_id FROM tbl_wiki WHERE page_id = ?2 '
+                                              'AND search_word IS NOT ?1', rows).rowcount
+        except connection.Error:
+            logger.exception("Exception occurred")
+            raise
 
-    def find_by_id(self, _id: tuple) -> list:
-        return self._find_by('tbl_id', _id)
+        return inserted
 
-    def find_by_page_id(self, page_id: tuple) -> list:
-        return self._find_by('page_id', page_id)
+    def stage_aliases(self, rows) -> None:
+        """Keep rows (alias, title) in a temporary table until resolve_staged_aliases, for aliases whose page
+        may be stored later (e.g. redirects of a dump that come before their target).
+        The table belongs to the connection of the writer thread, so staging and resolving are writes like others."""
+        rows = list(rows)
+        self._write(Repository._stage_aliases, rows, rows=len(rows))
 
-    def find_by_title(self, title: tuple) -> list:
-        return self._find_by('title', title)
+    @staticmethod
+    def _stage_aliases(connection: sqlite3.Connection, rows: list) -> None:
+        connection.execute('CREATE TEMP TABLE IF NOT EXISTS tmp_staged_alias (alias TEXT PRIMARY KEY, title TEXT)')
+        connection.executemany('INSERT OR IGNORE INTO tmp_staged_alias(alias, title) VALUES(?, ?)', rows)
 
-    def find_by_search_word(self, search_word: tuple) -> list:
-        return self._find_by('search_word', search_word)
+    def resolve_staged_aliases(self) -> int:
+        """Insert staged aliases whose title is stored into tbl_wiki_alias and clear the staging table.
+        Returns:
+            int: number of inserted aliases
+        """
+        return self._write(Repository._resolve_staged_aliases)
 
-    def find_all(self) -> list:
-        return self.cursor.execute('SELECT * FROM tbl_wiki').fetchall()
+    @staticmethod
+    def _resolve_staged_aliases(connection: sqlite3.Connection) -> int:
+        try:
+            connection.execute('CREATE TEMP TABLE IF NOT EXISTS tmp_staged_alias (alias TEXT PRIMARY KEY, title TEXT)')
+            # rowcount counts the rows of the statement only, not the rows changed by triggers.
+            sql = ('INSERT OR IGNORE INTO tbl_wiki_alias(alias, wiki_id) '
+                   'SELECT s.alias, w.tbl_id FROM tmp_staged_alias s '
+                   'JOIN tbl_wiki w ON {} '
+                   'WHERE w.search_word IS NOT s.alias').format(Repository._EXACT_MATCH.format('w.title', 's.title'))
+            inserted = connection.execute(sql).rowcount
+            connection.execute('DELETE FROM tmp_staged_alias')
+
+        except connection.Error:
+            logger.exception("Exception occurred")
+            raise
 
-    def filter_by(self, field: tuple, criteria: tuple, value: tuple) -> list:
+        return inserted
 
-        if all(len(lst) != len(field) for lst in [field, criteria, value]):
-            raise IndexError('Length of args must be equal.')
+    def insert(self, title: str, meaning: str, search_word=None, page_id=None, wait=True):
 
-        if not all(c in Repository._FILTER_CRITERIA for c in criteria):
-            raise ValueError('Incorrect criteria: {}'.format(criteria))
+        if search_word is None:
+            search_word = title
 
-        sql = "SELECT * FROM tbl_wiki WHERE "
+        try:
+            return self.insert_many([(page_id, title, meaning, search_word)], wait=wait)
+        except sqlite3.Error:
+            pass    # Logged by insert_many.
+
+    def insert_many(self, rows, wait=True) -> dict:
+        """Upsert many rows (an executemany of new pages and one of stored pages), committed by the writer thread
+        together with other queued writes. Only new pages take an id, so ids stay consecutive on re-ingest.
+        A row whose page_id is already stored updates title and meaning of the stored row, search_word is kept
+        (other search words of a page are its aliases, see insert_aliases). A row equal to the stored one is skipped.
+        A row that violates a constraint of tbl_wiki (e.g. a page without title) is logged and left out,
+        the other rows are written.
+        Args:
+            rows: iterable of tuples (page_id, title, meaning, search_word)
+            wait: bool, wait until the rows are committed, otherwise return a Future, default=True
+        Returns:
+            dict: {'inserted': int, 'updated': int, 'skipped': int, 'invalid': int} number of rows
+                (Future of it if wait is False)
+        """
+        rows = list(rows)
+        return self._write(self._insert_many, rows, rows=len(rows), wait=wait)
+
+    def _insert_many(self, connection: sqlite3.Connection, rows: list) -> dict:
+        cursor = connection.cursor()
+        cursor.row_factory = None
+        invalid = 0
+
+        try:
+            last_id = cursor.execute('SELECT IFNULL(MAX(tbl_id), 0) FROM tbl_wiki').fetchone()[0]
+            # rowcount counts the rows inserted or updated by the statements, not the rows changed by triggers.
+            cursor.execute('SAVEPOINT insert_many')
+            try:
+                changed = cursor.executemany(Repository._INSERT_NEW, rows).rowcount
+                changed += cursor.executemany(Repository._UPDATE_STORED, [row[:3] for row in rows]).rowcount
+            except sqlite3.IntegrityError:
+                # The rows are written one by one, so a bad row does not roll back the others.
+                cursor.execute('ROLLBACK TO insert_many')
+                changed = 0
+                for row in rows:
+                    try:
+                        changed += cursor.execute(Repository._INSERT_NEW, row).rowcount
+                        changed += cursor.execute(Repository._UPDATE_STORED, row[:3]).rowcount
+                    except sqlite3.IntegrityError as e:
+                        invalid += 1
+                        logger.warning('Row of page %r (%r) is not written: %s', row[0], row[1], e)
+            cursor.execute('RELEASE insert_many')
+            # New rows get ids above the last one (AUTOINCREMENT), all other changes are updates.
+            inserted = cursor.execute('SELECT COUNT(*) FROM tbl_wiki WHERE tbl_id > ?', (last_id,)).fetchone()[0]
+
+        except connection.Error:
+            logger.exception("Exception occurred")
+            raise
+
+        return {'inserted': inserted, 'updated': changed - inserted, 'skipped': len(rows) - changed - invalid,
+                'invalid': invalid}
+
+    def insert_failed(self, rows, ttl: int, wait=True) -> int:
+        """Remember failed responses for ttl seconds: rows (search_word, title, reason, page_id) are inserted into
+        tbl_wiki_failed, an existing entry of a search word is replaced (its expiry is renewed).
+        Returns:
+            int: number of inserted or replaced rows (Future of it if wait is False)
+        """
+        rows = [(search_word, title, reason, page_id, '+{} seconds'.format(int(ttl)))
+                for search_word, title, reason, page_id in rows if search_word]
+        return self._write(self._insert_failed, rows, rows=len(rows), wait=wait)
+
+    def _insert_failed(self, connection: sqlite3.Connection, rows: list) -> int:
+        try:
+            written = connection.executemany("INSERT OR REPLACE INTO tbl_wiki_failed(search_word, title, reason, "
+                                             "page_id, expires_at) VALUES(?, ?, ?, ?, datetime('now', ?))",
+                                             rows).rowcount
+        except connection.Error:
+            logger.exception("Exception occurred")
+            raise
+
+        return written
+
+    def find_failed(self, search_words) -> dict:
+        """Return {search_word: row (word, title, reason, page_id)} of the search words with an unexpired entry
+        in tbl_wiki_failed."""
+        rows = self._query_search_words(search_words, """
+        SELECT t.search_word word, f.title, f.reason, f.page_id FROM tmp_search_word t
+            JOIN tbl_wiki_failed f ON f.search_word = t.search_word
+        WHERE f.expires_at > datetime('now');
+        """, self.connection.cursor())
+        return {row.word: row for row in rows}
+
+    def purge_failed(self) -> int:
+        """Delete expired entries of tbl_wiki_failed and return their number."""
+        return self._write(lambda connection: connection.execute(
+            "DELETE FROM tbl_wiki_failed WHERE expires_at <= datetime('now')").rowcount)
+
+    def delete(self, _id: tuple, wait=True):
+        return self._write(lambda connection: connection.execute(
+            f"DELETE FROM tbl_wiki WHERE tbl_id IN ({','.join(['?']*len(_id))})", _id).rowcount,
+            rows=len(_id), wait=wait)
+
+    def find_by_id(self, _id: tuple, fetch=None):
+        return self._find_by('tbl_id', _id, fetch)
+
+    def find_by_page_id(self, page_id: tuple, fetch=None):
+        return self._find_by('page_id', page_id, fetch)
+
+    def find_by_title(self, title: tuple, fetch=None):
+        return self._find_by('title', title, fetch)
+
+    def find_by_search_word(self, search_word: tuple, fetch=None):
+        """Rows of tbl_wiki found by search_word or by an alias (tbl_wiki_alias)."""
+        return self.find_by_id(tuple(set(row.tbl_id for row in self.resolve_search_words(search_word).values())),
+                               fetch)
+
+    def find_all(self, fetch=None):
+        return self._select('SELECT * FROM tbl_wiki', fetch=fetch)
+
+    def search(self, text: str, columns=None, prefix=True, limit=50, offset=0, fetch=None):
+        """Full-text search of tbl_wiki, best matches first.
+        Every word of text must be found in one of the columns. Matches are ranked by bm25: a match in the title
+        weighs more than in the search word, and that more than in the meaning.
+        Args:
+            text: str, words to search, FTS5 syntax is not interpreted
+            columns: tuple of columns to search in ('title', 'search_word', 'meaning'), default=None (all)
+            prefix: bool, words match as prefixes ('pyth' finds 'Python'), default=True
+            limit, offset: int, page of the results, default=50, 0
+        Returns:
+            rows of tbl_wiki with 2 extra fields: score (higher is better) and snippet (matched part of meaning,
+            words found are in [brackets])
+        """
+        columns = tuple(columns or Repository._SEARCH_COLUMNS)
+        if not all(column in Repository._SEARCH_COLUMNS for column in columns):
+            raise ValueError('Incorrect columns: {}'.format(columns))
+
+        terms = re.findall(r'\w+', text)
+        if not terms:
+            return self._select('SELECT *, NULL score, NULL snippet FROM tbl_wiki LIMIT 0', fetch=fetch)
+
+        if not self.full_text:
+            # Without FTS5 every term is looked up by LIKE in a scan of tbl_wiki, results are not ranked.
+            condition = ' AND '.join(['({})'.format(' OR '.join('{} LIKE ?'.format(c) for c in columns))] * len(terms))
+            params = ['%{}%'.format(term) for term in terms for _ in columns]
+            return self._select(f"SELECT *, NULL score, substr(meaning, 1, 80) snippet FROM tbl_wiki "
+                                f"WHERE {condition} LIMIT ? OFFSET ?", (*params, limit, offset), fetch)
+
+        # Terms are quoted, so that words like AND, NOT or NEAR and symbols of the user are not FTS5 syntax.
+        query = ' '.join('"{}"{}'.format(term, '*' if prefix else '') for term in terms)
+        query = '{{{}}} : ({})'.format(' '.join(columns), query)
+        return self._select("""
+        SELECT w.*, -f.rank score, snippet(tbl_wiki_fts, 2, '[', ']', '...', 12) snippet
+        FROM tbl_wiki_fts f JOIN tbl_wiki w ON w.tbl_id = f.rowid
+        WHERE tbl_wiki_fts MATCH ?
+        ORDER BY f.rank
+        LIMIT ? OFFSET ?;
+        """, (query, limit, offset), fetch)
+
+    def filter_by(self, field: tuple, criteria: tuple, value: tuple, fetch=None):
+        """Rows of tbl_wiki that satisfy all conditions field[i] criteria[i] value[i], e.g.
+        filter_by(('title', 'created_date'), ('Starts with', 'Greater'), ('Py', '2020-01-31')).
+        Values are bound parameters and the SQL of a combination of fields and criteria is compiled once, so SQLite
+        reuses its prepared statement. Values of created_date are dates 'YYYY-MM-DD'.
+        Raises:
+            IndexError: args have different lengths
+            ValueError: incorrect field, criteria or date
+        """
+        if any(len(lst) != len(field) for lst in [criteria, value]):
+            raise IndexError('Length of args must be equal.')
 
+        conditions = []
+        params = []
         for f, c, v in zip(field, criteria, value):
+            if f not in Repository._FILTER_FIELDS:
+                raise ValueError('Incorrect field: {}'.format(f))
+            if c not in (Repository._DATE_CRITERIA if f == 'created_date' else Repository._FILTER_CRITERIA):
+                raise ValueError('Incorrect criteria for {}: {}'.format(f, c))
 
-            sql += '{} {} AND '.format('date({})'.format(f) if 'date' in f else f,
-                                       Repository._FILTER_CRITERIA[c].format(v))
-        sql = sql[0:len(sql) - len(' AND ')]
+            trigram = (self.full_text and c in Repository._TRIGRAM_CRITERIA and f in ('title', 'search_word')
+                       and len(str(v)) >= 3 and not any(char in str(v) for char in '%_'))
+            conditions.append((f, c, trigram))
+            params.extend(Repository._filter_params(f, c, v, trigram))
 
-        res = self.cursor.execute(sql)
-        return res.fetchall()
+        return self._select(Repository._compile_filter(tuple(conditions)), params, fetch)
 
-    def get_random_words(self, questions=10) -> list:
-        res = self.cursor.execute(f'SELECT title, meaning FROM tbl_wiki ORDER BY RANDOM() LIMIT 4*{questions}')
-        return res.fetchall()
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _compile_filter(conditions: tuple) -> str:
+        """SQL of conditions ((field, criteria, trigram), ...) with a parameter for every value."""
+        sql = []
+        for field, criteria, trigram in conditions:
+            if field == 'created_date':
+                sql.append(Repository._DATE_CRITERIA[criteria][0].format(field))
+            elif trigram:
+                sql.append(Repository._TRIGRAM_CRITERIA[criteria].format(field))
+            else:
+                sql.append(Repository._FILTER_CRITERIA[criteria].format(field))
+        return 'SELECT * FROM tbl_wiki WHERE ' + ' AND '.join(sql)
+
+    @staticmethod
+    def _filter_params(field: str, criteria: str, value, trigram=False) -> tuple:
+        """Parameters of a condition of filter_by (in order of its placeholders)."""
+        if field == 'created_date':
+            try:
+                day = datetime.date.fromisoformat(str(value).strip())
+            except ValueError:
+                raise ValueError('Incorrect date: {!r}, expected YYYY-MM-DD.'.format(value)) from None
+            days = {'day': day.isoformat(), 'next_day': (day + datetime.timedelta(days=1)).isoformat()}
+            return tuple(days[name] for name in Repository._DATE_CRITERIA[criteria][1])
+
+        if criteria in ('Starts with', 'Contains', 'Does not contain', 'Ends with'):
+            value = str(value)
+            # Wildcards of the value are escaped, 'a_b' matches 'a_b' only (the trigram index gets no wildcards).
+            escaped = value if trigram else re.sub(r'([\\%_])', r'\\\1', value)
+            if criteria == 'Starts with':
+                return value, value + '\U0010ffff', escaped + '%'
+            if criteria == 'Ends with':
+                return '%' + escaped,
+            return '%' + escaped + '%',
+
+        if criteria == 'Is equal to':
+            return value, value
+
+        return value,
+
+    def find_ingest_job(self, job: str) -> namedtuple:
+        """Return the ingest job with its number of completed batches and their outcomes, None if it does not exist."""
+        return self.cursor.execute("""
+        SELECT
+            j.job, j.batch_size, j.created_date, j.finished_date,
+            COUNT(b.batch_no) batches, IFNULL(SUM(b.known), 0) known, IFNULL(SUM(b.succeed), 0) succeed,
+            IFNULL(SUM(b.failed), 0) failed, IFNULL(SUM(b.written), 0) written
+        FROM tbl_ingest_job j LEFT JOIN tbl_ingest_journal b ON b.job = j.job
+        WHERE j.job = ?
+        GROUP BY j.job;
+        """, (job,)).fetchone()
+
+    def find_ingest_jobs(self) -> list:
+        return [self.find_ingest_job(row[0]) for row in
+                self._plain_cursor().execute('SELECT job FROM tbl_ingest_job ORDER BY created_date')]
+
+    def create_ingest_job(self, job: str, batch_size: int) -> None:
+        self._write(lambda connection: connection.execute('INSERT INTO tbl_ingest_job(job, batch_size) VALUES(?, ?)',
+                                                          (job, batch_size)))
+
+    def finish_ingest_job(self, job: str) -> None:
+        self._write(lambda connection: connection.execute(
+            'UPDATE tbl_ingest_job SET finished_date = CURRENT_TIMESTAMP WHERE job = ?', (job,)))
+
+    def completed_batches(self, job: str) -> set:
+        """Numbers of the batches of the job that are recorded in the journal."""
+        return set(row[0] for row in
+                   self._plain_cursor().execute('SELECT batch_no FROM tbl_ingest_journal WHERE job = ?', (job,)))
+
+    def record_batch(self, job: str, batch_no: int, known: int, succeed: int, failed: int, written: int,
+                     wait=True):
+        """Append a completed batch of the job to the journal. The journal is append-only: a batch is recorded once,
+        after its responses were saved. Writes are committed in the order they are submitted, so a batch recorded
+        with wait=False is never committed before the responses that were submitted before it."""
+        return self._write(self._record_batch, (job, batch_no, known, succeed, failed, written), wait=wait)
 
-    def insert_statistic(self, correct_answers: int, time_spent: int, questions=10):
+    @staticmethod
+    def _record_batch(connection: sqlite3.Connection, row: tuple) -> None:
         try:
-            self.cursor.execute('BEGIN')
-            self.cursor.execute('INSERT INTO game_stat(correct_answers, number_of_questions, time_spent) '
-                                'VALUES(?, ?, ?)', (correct_answers, questions, time_spent))
-            self.cursor.execute('COMMIT')
+            connection.execute('INSERT OR IGNORE INTO tbl_ingest_journal(job, batch_no, known, succeed, failed, '
+                               'written) VALUES(?, ?, ?, ?, ?, ?)', row)
+        except connection.Error:
+            logger.exception("Exception occurred")
+            raise
 
-        except self.connection.Error:
-            self.cursor.execute('ROLLBACK')
+    def get_random_words(self, questions=10, fetch=None):
+        return self._select('SELECT title, meaning FROM tbl_wiki ORDER BY RANDOM() LIMIT ?', (4 * questions,), fetch)
+
+    def insert_statistic(self, correct_answers: int, time_spent: int, questions=10, wait=True):
+        try:
+            return self._write(self._insert_statistic, (correct_answers, questions, time_spent), wait=wait)
+        except sqlite3.Error:
+            pass    # Logged by _insert_statistic.
+
+    @staticmethod
+    def _insert_statistic(connection: sqlite3.Connection, row: tuple) -> None:
+        try:
+            connection.execute('INSERT INTO game_stat(correct_answers, number_of_questions, time_spent) '
+                               'VALUES(?, ?, ?)', row)
+        except connection.Error:
             logger.exception("Exception occurred")
+            raise
 
     def get_stat(self) -> namedtuple:
         res = self.cursor.execute("""
@@ -157,12 +843,11 @@ class Repository:
         """)
         return res.fetchone()
 
-    def del_stat(self) -> None:
-        self.cursor.execute(f"DELETE FROM game_stat")
-        self.connection.commit()
+    def del_stat(self, wait=True):
+        return self._write(lambda connection: connection.execute("DELETE FROM game_stat").rowcount, wait=wait)
 
-    def get_stat2(self):
-        return self.cursor.execute("SELECT * FROM game_stat").fetchall()
+    def get_stat2(self, fetch=None):
+        return self._select("SELECT * FROM game_stat", fetch=fetch)
 
 
 if __name__ == '__main__':
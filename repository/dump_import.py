@@ -0,0 +1,242 @@
+#!repository/dump_import.py Python3
+"""
+This module contains DumpImporter, the offline bulk import of a Wikipedia pages-articles dump into tbl_wiki.
+Dumps are available at https://dumps.wikimedia.org/enwiki/latest/ (enwiki-latest-pages-articles.xml.bz2).
+
+The dump is streamed: the XML is parsed page by page and every parsed page is released right away, so memory
+does not depend on the size of the dump. Only articles (namespace 0) are imported and rows keep the semantics of
+WikiService:
+    title - title of the article
+    search_word - title of the article (a searched word that was not redirected)
+    page_id - id of the article
+    meaning - first 3 sentences of the lead section as plain text (the same as exsentences=3 in WikiHttp)
+Disambiguation pages are skipped, the same as DisambiguationResponse is never stored by WikiService.
+Redirects are stored as aliases of their target article (tbl_wiki_alias). A redirect can come before its target
+in the dump, so redirects are staged in a temporary table and resolved by title once all articles are imported.
+The full-text indexes are not updated row by row during the import, they are rebuilt once at the end
+(see Repository.deferred_search_index).
+
+Parallelism:
+    - .bz2 dumps are decompressed by lbzip2 or pbzip2 in a separate process if one of them is installed.
+    - wikitext of the pages is converted to plain text by a pool of worker processes ('workers').
+
+Abstract dumps (enwiki-latest-abstract.xml.gz) are not supported: they do not contain page ids.
+
+Example:
+    python -m repository.dump_import enwiki-latest-pages-articles.xml.bz2 --workers 4
+"""
+import argparse
+import bz2
+import gzip
+import re
+import shutil
+import subprocess
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import deque
+from contextlib import contextmanager
+from multiprocessing import Pool
+from repository.db_setup import Repository, logger
+from constants import DB_PATH
+
+
+_DISAMBIGUATION = re.compile(r'{{\s*(disambiguation|disambig|dab|hndis|geodis|numberdis|[^{}|]*disambiguation)\s*[|}]',
+                             re.IGNORECASE)
+_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+_REF = re.compile(r'<ref[^>/]*/>|<ref[^>]*>.*?</ref>', re.DOTALL | re.IGNORECASE)
+_TAG = re.compile(r'<[^>]+>')
+_TEMPLATE = re.compile(r'{{[^{}]*}}')
+_TABLE = re.compile(r'{\|[^{}]*?\|}', re.DOTALL)
+_FILE = re.compile(r'\[\[(?:File|Image):[^\[\]]*(?:\[\[[^\[\]]*\]\][^\[\]]*)*\]\]', re.IGNORECASE)
+_LINK = re.compile(r'\[\[(?:[^|\[\]]*\|)?([^\[\]]*)\]\]')
+_EXTERNAL_LINK = re.compile(r'\[https?://[^\s\]]+\s?([^\]]*)\]')
+_QUOTES = re.compile(r"'{2,}")
+_SPACES = re.compile(r'[ \t]+')
+_SENTENCE = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'(])')
+
+
+def extract_lead(wikitext: str, sentences=3) -> str:
+    """Convert the lead section of wikitext to plain text and return its first 'sentences' sentences."""
+    lead = wikitext.split('\n==', 1)[0]
+    lead = _COMMENT.sub('', lead)
+    lead = _REF.sub('', lead)
+
+    # Templates and tables can be nested, so they are removed from the innermost one.
+    previous = None
+    while previous != lead:
+        previous = lead
+        lead = _TABLE.sub('', _TEMPLATE.sub('', lead))
+
+    lead = _FILE.sub('', lead)
+    lead = _LINK.sub(r'\1', lead)
+    lead = _EXTERNAL_LINK.sub(r'\1', lead)
+    lead = _TAG.sub('', _QUOTES.sub('', lead))
+
+    paragraphs = [_SPACES.sub(' ', line).strip() for line in lead.split('\n')]
+    text = ' '.join(line for line in paragraphs if line and not line.startswith(('|', '!', '*', '#', ':', ';')))
+    text = text.replace(' ,', ',').replace('( ', '(').replace(' )', ')').replace('()', '').replace('  ', ' ')
+
+    return ' '.join(_SENTENCE.split(text)[:sentences]).strip()
+
+
+def _extract_rows(pages: list) -> list:
+    """Worker function: [(page_id, title, wikitext)] -> rows for Repository.insert_many."""
+    rows = []
+    for page_id, title, wikitext in pages:
+        if _DISAMBIGUATION.search(wikitext):
+            continue
+
+        meaning = extract_lead(wikitext)
+        if meaning:
+            rows.append((page_id, title, meaning, title))
+    return rows
+
+
+class DumpImporter:
+    """Stream a pages-articles dump into tbl_wiki.
+    Args:
+        repo: Repository object (database)
+        workers: number of processes that convert wikitext to plain text, 0 means in the current process, default=2
+        batch_size: number of pages sent to a worker and inserted in one transaction, default=5000
+    """
+
+    def __init__(self, repo: Repository, workers=2, batch_size=5000):
+        self.repo = repo
+        self.workers = workers
+        self.batch_size = batch_size
+        self.stats = {'pages': 0, 'articles': 0, 'redirects': 0, 'skipped': 0, 'inserted': 0, 'updated': 0,
+                      'aliases': 0}
+        self._redirects = []
+
+    @staticmethod
+    @contextmanager
+    def _open(path: str):
+        """Open dump for binary reading, decompressing .bz2 (in parallel if lbzip2/pbzip2 exists) and .gz.
+        The decompressor process is waited for when the dump is closed.
+        Raises:
+            subprocess.CalledProcessError: the decompressor failed (e.g. a truncated .bz2), the pages read
+                until then are imported, but the import is not complete
+        """
+        if path.endswith('.bz2'):
+            tool = shutil.which('lbzip2') or shutil.which('pbzip2')
+            if tool is not None:
+                process = subprocess.Popen([tool, '-dc', path], stdout=subprocess.PIPE, bufsize=1 << 20)
+                try:
+                    yield process.stdout
+                except BaseException:
+                    process.kill()
+                    raise
+                finally:
+                    process.stdout.close()
+                    process.wait()
+
+                if process.returncode != 0:
+                    raise subprocess.CalledProcessError(process.returncode, process.args)
+                return
+
+            opener = bz2.open
+        elif path.endswith('.gz'):
+            opener = gzip.open
+        else:
+            opener = open
+
+        with opener(path, 'rb') as file:
+            yield file
+
+    def iter_pages(self, file):
+        """Yield (page_id, title, wikitext) of articles and stage redirects. Parsed pages are cleared,
+        so memory stays constant."""
+        context = ElementTree.iterparse(file, events=('start', 'end'))
+        _, root = next(context)
+        namespace = root.tag[:root.tag.index('}') + 1] if root.tag.startswith('{') else ''
+        tags = {name: namespace + name for name in ('page', 'title', 'ns', 'id', 'redirect', 'revision', 'text')}
+
+        for event, element in context:
+            if event != 'end' or element.tag != tags['page']:
+                continue
+
+            self.stats['pages'] += 1
+            if element.findtext(tags['ns']) == '0':
+                redirect = element.find(tags['redirect'])
+                if redirect is not None:
+                    self.stats['redirects'] += 1
+                    self._stage_redirect(element.findtext(tags['title']), redirect.get('title'))
+                else:
+                    self.stats['articles'] += 1
+                    yield (int(element.findtext(tags['id'])), element.findtext(tags['title']),
+                           element.findtext('{}/{}'.format(tags['revision'], tags['text'])) or '')
+
+            element.clear()
+            root.clear()
+
+    def _stage_redirect(self, title: str, target: str) -> None:
+        if title and target:
+            self._redirects.append((title, target))
+        if len(self._redirects) >= self.batch_size:
+            self.repo.stage_aliases(self._redirects)
+            self._redirects = []
+
+    def _batches(self, pages):
+        batch = []
+        for page in pages:
+            batch.append(page)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _insert(self, rows: list, pages: int) -> None:
+        # Disambiguation pages, pages without lead text and rows that can not be stored are skipped.
+        self.stats['skipped'] += pages - len(rows)
+        counts = self.repo.insert_many(rows)
+        self.stats['skipped'] += counts['invalid']
+        self.stats['inserted'] += counts['inserted']
+        self.stats['updated'] += counts['updated']
+
+    def run(self, path: str) -> dict:
+        """Import the dump at path and return statistics of the import.
+        Raises:
+            subprocess.CalledProcessError: the decompressor of a .bz2 dump failed
+            xml.etree.ElementTree.ParseError: the dump is not well-formed (e.g. truncated)
+        """
+        start = time.time()
+
+        with self.repo.deferred_search_index(), DumpImporter._open(path) as file:
+            batches = self._batches(self.iter_pages(file))
+
+            if not self.workers:
+                for batch in batches:
+                    self._insert(_extract_rows(batch), len(batch))
+            else:
+                # At most 2 batches per worker are in flight, so a fast parser can not fill the memory.
+                with Pool(self.workers) as pool:
+                    pending = deque()
+                    for batch in batches:
+                        pending.append((pool.apply_async(_extract_rows, (batch,)), len(batch)))
+                        if len(pending) >= 2 * self.workers:
+                            result, size = pending.popleft()
+                            self._insert(result.get(), size)
+
+                    while pending:
+                        result, size = pending.popleft()
+                        self._insert(result.get(), size)
+
+        self.repo.stage_aliases(self._redirects)
+        self._redirects = []
+        self.stats['aliases'] = self.repo.resolve_staged_aliases()
+
+        self.stats['seconds'] = round(time.time() - start, 2)
+        logger.info('Dump imported: {}'.format(self.stats))
+        return self.stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import Wikipedia pages-articles dump into tbl_wiki')
+    parser.add_argument('path', help='pages-articles dump (.xml, .xml.bz2 or .xml.gz)')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    print(DumpImporter(Repository(args.db), args.workers, args.batch_size).run(args.path))
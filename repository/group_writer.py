@@ -0,0 +1,162 @@
+#!repository/group_writer.py Python3
+"""
+This module contains GroupWriter, the single writer thread of a database (see ConnectionPool.writer).
+
+Writes of all Repository objects of a database (ingest, game statistics, deletes from the GUI) are put into
+one queue and executed by one thread on its own connection. Instead of a commit per write, queued operations
+are grouped into one transaction (group commit), which is committed when
+    - the queue is empty, or
+    - max_delay seconds passed since the first operation of the group, or
+    - the operations of the group changed about max_rows rows.
+A single writer does not wait for a commit longer than before. Operations that are queued while a group is executed
+(concurrent writers, e.g. an ingest and the game, or writes submitted with wait=False) join it, so they share
+the commit (and its fsync) and a writer never waits for the lock of another one.
+
+Every operation runs in its own savepoint: an operation that fails is rolled back alone, the rest of the group
+is committed. If the group itself fails (e.g. the write lock is not acquired within the busy timeout), it is
+rolled back, all its operations get the exception and the writer goes on with the next group.
+Submit returns a Future, which is resolved with the result of the operation once it is committed
+(or with its exception). Operations are executed in the order they were submitted.
+
+Example:
+    future = writer.submit(lambda connection: connection.execute('DELETE FROM game_stat').rowcount)
+    future.result()     # number of deleted rows, once the deletion is committed
+"""
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+
+class _Operation:
+    __slots__ = ('function', 'args', 'rows', 'future', 'result', 'error')
+
+    def __init__(self, function, args, rows):
+        self.function = function
+        self.args = args
+        self.rows = rows
+        self.future = Future()
+        self.result = None
+        self.error = None
+
+
+class GroupWriter:
+    """Writer thread with group commit.
+    Args:
+        pool: ConnectionPool object, the writer thread uses its own connection of the pool
+        max_delay: float, seconds after which a group is committed even if more operations are queued,
+            default=0.05
+        max_rows: int, number of rows that ends a group earlier, default=10000
+    """
+
+    MAX_DELAY = 0.05
+    MAX_ROWS = 10000
+
+    _STOP = object()
+
+    def __init__(self, pool, max_delay=MAX_DELAY, max_rows=MAX_ROWS):
+        self.pool = pool
+        self.max_delay = max_delay
+        self.max_rows = max_rows
+        self.operations = 0
+        self.commits = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        return '{}(operations={}, commits={}, pending={})'.format(self.__class__.__name__, self.operations,
+                                                                  self.commits, self._queue.qsize())
+
+    def submit(self, function, *args, rows=1) -> Future:
+        """Queue function(connection, *args) and return a Future of its result.
+        Args:
+            function: callable(connection, *args), executes statements without BEGIN/COMMIT
+            rows: int, number of rows the operation changes (approximately), default=1
+        Raises:
+            RuntimeError: the writer is closed
+        """
+        if not self._thread.is_alive():
+            raise RuntimeError('Writer of {!r} is closed.'.format(self.pool.db_path))
+
+        operation = _Operation(function, args, rows)
+        self._queue.put(operation)
+        return operation.future
+
+    def flush(self) -> None:
+        """Wait until all operations submitted so far are committed."""
+        self.submit(lambda connection: None).result()
+
+    def close(self) -> None:
+        """Commit the queued operations and stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(GroupWriter._STOP)
+            self._thread.join()
+
+    def _run(self) -> None:
+        connection = self.pool.connection()
+        connection.isolation_level = None   # transactions are controlled explicitly
+
+        stop = False
+        while not stop:
+            operation = self._queue.get()
+            if operation is GroupWriter._STOP:
+                break
+
+            group = [operation]
+            rows = 0
+            deadline = time.monotonic() + self.max_delay
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+
+                # Queued operations join the group until the queue is empty or the delay or the rows are used up.
+                while True:
+                    self._execute(connection, operation)
+                    rows += operation.rows
+                    if rows >= self.max_rows or time.monotonic() >= deadline:
+                        break
+                    try:
+                        operation = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if operation is GroupWriter._STOP:
+                        stop = True
+                        break
+                    group.append(operation)
+
+                connection.execute('COMMIT')
+
+            except Exception as error:
+                self._fail(connection, group, error)
+                continue
+
+            self.operations += len(group)
+            self.commits += 1
+            for operation in group:
+                if operation.error is not None:
+                    operation.future.set_exception(operation.error)
+                else:
+                    operation.future.set_result(operation.result)
+
+    @staticmethod
+    def _execute(connection: sqlite3.Connection, operation: _Operation) -> None:
+        connection.execute('SAVEPOINT operation')
+        try:
+            operation.result = operation.function(connection, *operation.args)
+        except Exception as error:
+            operation.error = error
+            connection.execute('ROLLBACK TO operation')
+        connection.execute('RELEASE operation')
+
+    @staticmethod
+    def _fail(connection: sqlite3.Connection, group: list, error: Exception) -> None:
+        """Roll back the group and pass the error to all its operations, none of them was committed."""
+        try:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+        except sqlite3.Error:
+            pass    # The transaction is gone anyway, the next group begins a new one.
+
+        for operation in group:
+            operation.future.set_exception(error)
@@ -0,0 +1,200 @@
+#!test_cases/fake_wiki_server.py Python3
+"""
+This module contains FakeWikiServer, a local stand-in for the api.php query endpoint of MediaWiki.
+It answers the query sent by WikiHttp with JSON of the same shape as described in api/wiki_http.py,
+so the whole ingest path (WikiHttp -> ResponseParser -> Repository) can be run without en.wikipedia.org.
+
+Every title is answered deterministically:
+    1. contains one of []{}<># or is empty -> invalid page
+    2. contains '_' or starts with a lower case letter -> 'normalized' entry, then the normalized title is used
+    3. starts with 'Missing' -> missing page
+    4. starts with 'Redirect ' -> 'redirects' entry to the rest of the title, e.g. 'Redirect Python' -> 'Python'
+    5. starts with 'Ambiguous' -> disambiguation page (pageprops)
+    6. anything else -> article with a fake extract and page id derived from the title
+At most 20 extracts are returned per request (exlimit), the rest is given in continuation ('continue': excontinue).
+
+Latency and errors can be injected:
+    latency: seconds every request takes, jitter: random seconds added to latency,
+    error_rate: share of requests that fail with HTTP 429 (Retry-After), HTTP 503 or 'maxlag' error.
+
+Example:
+    with FakeWikiServer(latency=0.02, error_rate=0.01) as server:
+        http = WikiHttp(url=server.url)
+        http.get(['Python', 'Missing word', 'Redirect Python'])
+
+Run from the command line:
+    python -m test_cases.fake_wiki_server --port 8080 --latency 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeWikiServer:
+    """Local HTTP server that imitates MediaWiki query API.
+    Args:
+        host: str, default='127.0.0.1'
+        port: int, 0 means any free port, default=0
+        latency: float, seconds every request takes, default=0
+        jitter: float, random seconds added to latency, default=0
+        error_rate: float, share of requests that fail (429, 503 or maxlag), default=0
+    """
+
+    _INVALID_CHARACTERS = set('[]{}<>#')
+    _EXTRACTS_LIMIT = 20
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()   # handler threads count the requests concurrently
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}/w/api.php'.format(host, port)
+
+    def start(self) -> None:
+        """Serve requests in a background thread."""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def page_id(title: str) -> int:
+        """Deterministic positive page id of a title."""
+        return zlib.crc32(title.encode('utf-8')) % 2 ** 31 + 1
+
+    @staticmethod
+    def extract(title: str) -> str:
+        return '{0} is a fake article. It is served by FakeWikiServer. {0} has no real meaning.'.format(title)
+
+    def query(self, params: dict) -> dict:
+        """Build the JSON for the query parameters, the same way MediaWiki does it."""
+        titles = params.get('titles', '').split('|')
+        offset = int(params.get('excontinue', 0))
+        query = {'normalized': [], 'redirects': [], 'pageids': [], 'pages': {}}
+        negative_id = 0
+        articles = []
+
+        for title in titles:
+            if not title.strip() or set(title) & FakeWikiServer._INVALID_CHARACTERS:
+                negative_id -= 1
+                query['pages'][str(negative_id)] = {
+                    'title': title, 'invalid': '',
+                    'invalidreason': 'The requested page title contains invalid characters or is empty.'}
+                continue
+
+            normalized = ' '.join(title.replace('_', ' ').split())
+            normalized = normalized[0].upper() + normalized[1:]
+            if normalized != title:
+                query['normalized'].append({'from': title, 'to': normalized})
+
+            if normalized.startswith('Redirect '):
+                target = normalized[len('Redirect '):]
+                query['redirects'].append({'from': normalized, 'to': target})
+                normalized = target
+
+            if normalized.startswith('Missing'):
+                negative_id -= 1
+                query['pages'][str(negative_id)] = {'ns': 0, 'title': normalized, 'missing': ''}
+                continue
+
+            page_id = FakeWikiServer.page_id(normalized)
+            page = {'pageid': page_id, 'ns': 0, 'title': normalized}
+            if normalized.startswith('Ambiguous'):
+                page['pageprops'] = {'disambiguation': ''}
+
+            if str(page_id) not in query['pages']:
+                query['pages'][str(page_id)] = page
+                articles.append(page)
+
+        for page in articles[offset:offset + FakeWikiServer._EXTRACTS_LIMIT]:
+            page['extract'] = FakeWikiServer.extract(page['title']) if 'pageprops' not in page \
+                else '{} may refer to:'.format(page['title'])
+
+        query['pageids'] = list(query['pages'])
+        js = {'query': {key: value for key, value in query.items() if value}}
+        js['query'].setdefault('pages', {})
+
+        if offset + FakeWikiServer._EXTRACTS_LIMIT < len(articles):
+            js['continue'] = {'excontinue': offset + FakeWikiServer._EXTRACTS_LIMIT, 'continue': '||pageprops'}
+        else:
+            js['batchcomplete'] = ''
+
+        return js
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler of FakeWikiServer."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        fake = self.server.fake
+        with fake._lock:
+            fake.requests += 1
+        time.sleep(fake.latency + random.uniform(0, fake.jitter))
+
+        if random.random() < fake.error_rate:
+            error = random.choice([429, 503, 'maxlag'])
+            if error == 'maxlag':
+                self._send(200, {'error': {'code': 'maxlag', 'info': 'Waiting for a database server', 'lag': 6}},
+                           {'Retry-After': '1'})
+            else:
+                self._send(error, {'error': {'code': 'http', 'info': 'Injected error'}}, {'Retry-After': '1'})
+            return
+
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        self._send(200, fake.query(params))
+
+    def _send(self, status: int, js: dict, headers=None):
+        body = json.dumps(js).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for MediaWiki api.php')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeWikiServer(args.host, args.port, args.latency, args.jitter, args.error_rate)
+    print('Serving', server.url)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,124 @@
+#!test_cases/ingest_benchmark.py Python3
+"""
+This module is the end-to-end ingest benchmark: WikiHttp -> ResponseParser -> Repository.insert.
+MediaWiki is replaced by FakeWikiServer (see test_cases/fake_wiki_server.py), so it runs offline and in CI.
+
+For every size, a fresh database is filled through WikiService.get_meanings_from_wiki in batches of words,
+and the following is reported:
+    words/s: ingested words per second (all responses, successful or not)
+    batch p50/p95/p99: latency of a get_meanings_from_wiki call (ms)
+    chunk p50/p95/p99: latency of a single chunk request incl. continuation (ms)
+
+With --pipeline, words are ingested by WikiService.ingest (see api/ingest_pipeline.py) in one call instead,
+so batch latencies are not measured and the throughput of every pipeline stage is printed.
+
+The generated words are a mix of articles, missing, invalid, redirected and disambiguation titles.
+
+Example:
+    python -m test_cases.ingest_benchmark --sizes 1000 10000 100000 --latency 0.02 --error-rate 0.01
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import deque
+from api.wiki_http import WikiHttp
+from api.wiki_service import WikiService
+from api.rate_limiter import RateLimiter
+from repository.db_setup import Repository
+from test_cases.fake_wiki_server import FakeWikiServer
+
+
+def generate_words(size: int, seed=0) -> list:
+    """Generate 'size' distinct words: 80% articles, 8% missing, 6% redirects, 4% disambiguation, 2% invalid."""
+    rnd = random.Random(seed)
+    kinds = ['Article {}'] * 80 + ['Missing {}'] * 8 + ['Redirect Article r{}'] * 6 + \
+            ['Ambiguous {}'] * 4 + ['Invalid[{}]'] * 2
+    return [rnd.choice(kinds).format(i) for i in range(size)]
+
+
+def percentiles(values, quantiles=(0.5, 0.95, 0.99)) -> list:
+    values = sorted(values)
+    if not values:
+        return [0.0] * len(quantiles)
+    return [values[min(len(values) - 1, int(len(values) * q))] for q in quantiles]
+
+
+class RecordedLatencies(deque):
+    """WikiHttp.latencies that keeps its bound (the hedge delay is a quantile of the recent latencies only),
+    but also records all latencies for the chunk percentiles of the report."""
+
+    def __init__(self, maxlen: int):
+        super().__init__(maxlen=maxlen)
+        self.all = []
+
+    def append(self, latency: float) -> None:
+        super().append(latency)
+        self.all.append(latency)
+
+
+def run(size: int, url: str, batch_size: int, max_workers: int, db_path: str, pipeline=False) -> dict:
+    """Ingest 'size' words into a fresh database at db_path and return measurements."""
+    wiki_http = WikiHttp(max_workers=max_workers, url=url, rate_limiter=RateLimiter(rate=10000, max_rate=10000,
+                                                                                     burst=max_workers))
+    wiki_http.latencies = RecordedLatencies(wiki_http.latencies.maxlen)
+    repo = Repository(db_path)
+    service = WikiService(wiki_http=wiki_http, repo=repo)
+
+    words = generate_words(size)
+    batch_latencies = []
+    succeed = failed = 0
+    stages = dict()
+
+    start = time.perf_counter()
+    try:
+        if pipeline:
+            stats = service.ingest(iter(words), batch_size=batch_size)
+            succeed, failed, stages = stats['succeed'], stats['failed'], stats['stages']
+        else:
+            for i in range(0, len(words), batch_size):
+                batch_start = time.perf_counter()
+                suc, fail = service.get_meanings_from_wiki(words[i:i + batch_size])
+                batch_latencies.append(time.perf_counter() - batch_start)
+                succeed, failed = succeed + len(suc), failed + len(fail)
+        elapsed = time.perf_counter() - start
+    finally:
+        # Every size has a database of its own, its writer thread and connections are not needed afterwards.
+        wiki_http.close()
+        repo.pool.close()
+
+    return {'size': size, 'seconds': elapsed, 'words_per_second': size / elapsed,
+            'succeed': succeed, 'failed': failed,
+            'batch': percentiles(batch_latencies), 'chunk': percentiles(wiki_http.latencies.all), 'stages': stages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end ingest throughput benchmark against FakeWikiServer')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--max-workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--pipeline', action='store_true', help='ingest by WikiService.ingest')
+    args = parser.parse_args()
+
+    print('{:>8} {:>9} {:>10} {:>8} {:>8}  {:>24}  {:>24}'.format(
+        'words', 'seconds', 'words/s', 'succeed', 'failed', 'batch p50/p95/p99 (ms)', 'chunk p50/p95/p99 (ms)'))
+
+    with FakeWikiServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate) as server:
+        for size in args.sizes:
+            with tempfile.TemporaryDirectory() as directory:
+                res = run(size, server.url, args.batch_size, args.max_workers, os.path.join(directory, 'bench.db'),
+                          args.pipeline)
+
+            print('{size:>8} {seconds:>9.2f} {words_per_second:>10.0f} {succeed:>8} {failed:>8}  {batch:>24}  '
+                  '{chunk:>24}'.format(**dict(res, batch='/'.join('{:.0f}'.format(v * 1000) for v in res['batch']),
+                                              chunk='/'.join('{:.0f}'.format(v * 1000) for v in res['chunk']))))
+            for stage in res['stages'].values():
+                print('{:>8} {}'.format('', stage))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!test_cases/support.py Python3
+"""
+This module contains helpers shared by the tests in test_cases/:
+    FakeWikiHttp - WikiHttp that answers requests without network
+    RepositoryTestCase - TestCase with a Repository of a fresh database in a temporary directory
+
+Example:
+    class MyTest(RepositoryTestCase):
+        def test_words(self):
+            WikiService(wiki_http=FakeWikiHttp(), repo=self.repo).get_meanings_from_wiki(['Python'])
+"""
+import os
+import tempfile
+import threading
+import unittest
+import zlib
+from api.wiki_http import WikiHttp, WikiHttpError, WikiHttpRetryError
+from repository.db_setup import Repository
+
+
+class FakeWikiHttp(WikiHttp):
+    """WikiHttp without network: _request answers every title as an existing page (its id is the crc32
+    of the title, so ids are stable across chunks), except the titles in 'rejected' (MediaWiki returns an error
+    for the whole request, WikiHttp bisects the chunk) and all titles if 'unavailable' is set (retries
+    are exhausted). Titles of all requests are kept in 'requested'. Hedging is off."""
+
+    def __init__(self, rejected=(), unavailable=False, **kwargs):
+        super().__init__(hedge=False, **kwargs)
+        self.rejected = set(rejected)
+        self.unavailable = unavailable
+        self.requests = 0
+        self.requested = []
+        self._lock = threading.Lock()     # chunks are requested by several threads
+
+    def _request(self, params: dict) -> dict:
+        titles = params['titles'].split('|')
+        with self._lock:
+            self.requests += 1
+            self.requested.extend(titles)
+
+        if self.unavailable:
+            raise WikiHttpRetryError('Request failed after 5 retries: HTTP 503')
+        if self.rejected.intersection(titles):
+            raise WikiHttpError('HTTP 200: invalid title')
+
+        pages = {str(zlib.crc32(title.encode())): {'pageid': zlib.crc32(title.encode()), 'title': title,
+                                                   'extract': 'Meaning of {}.'.format(title)} for title in titles}
+        return {'batchcomplete': '', 'query': {'pageids': list(pages), 'pages': pages}}
+
+
+class RepositoryTestCase(unittest.TestCase):
+    """TestCase with self.repo, a Repository of the database self.path in a temporary directory.
+    The pool of self.repo is closed and the directory removed after every test, also if setUp of a subclass
+    fails or skips the test."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'test.db')
+        self.repo = Repository(self.path)
+        # self.repo may be replaced by a test (e.g. to reopen the database), its current pool is closed.
+        self.addCleanup(lambda: self.repo.pool.close())
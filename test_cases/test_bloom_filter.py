@@ -0,0 +1,82 @@
+#!test_cases/test_bloom_filter.py Python3
+"""
+Tests of the Bloom filter of Repository.missing_search_words (repository/bloom_filter.py, repository/db_setup.py):
+no stored search word is reported missing, whoever wrote it, and the rate of false positives stays bounded.
+
+Example:
+    python -m pytest test_cases/test_bloom_filter.py
+"""
+import sqlite3
+import unittest
+from repository.bloom_filter import BloomFilter
+from repository.db_setup import Repository
+from test_cases.support import RepositoryTestCase
+
+
+class BloomFilterTest(unittest.TestCase):
+
+    def test_no_false_negatives_and_bounded_error_rate(self):
+        bloom = BloomFilter(capacity=20000, error_rate=0.01)
+        bloom.update('word {}'.format(i) for i in range(20000))
+
+        self.assertTrue(all('word {}'.format(i) in bloom for i in range(20000)))
+        false_positives = sum('other {}'.format(i) in bloom for i in range(20000))
+        self.assertLess(false_positives / 20000, 0.02)
+        self.assertFalse(bloom.is_full)
+
+
+class RepositoryBloomTest(RepositoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.repo.insert_many([(1, 'Alpha', 'first', 'alpha')])
+        self.repo.enable_bloom_filter()
+
+    def test_writes_of_the_repository_are_found(self):
+        self.repo.insert_many([(page_id, 'Title {}'.format(page_id), None, 'word {}'.format(page_id))
+                               for page_id in range(2, 2002)])
+        self.repo.insert_aliases([('a', 1)])
+        self.repo.insert_failed([('x', None, 'missing', -1)], ttl=60)
+        self.repo.stage_aliases([('b', 'Alpha')])
+        self.repo.resolve_staged_aliases()
+
+        words = ['alpha', 'a', 'b', 'x'] + ['word {}'.format(page_id) for page_id in range(2, 2002)]
+        self.assertEqual(self.repo.missing_search_words(words + ['unknown']), ['unknown'])
+
+    def test_writes_of_another_repository_and_process_are_found(self):
+        Repository(self.path).insert_many([(2, 'Beta', 'second', 'beta')])
+
+        # Another process writes with its own connection, not through the pool of this one.
+        other = sqlite3.connect(self.path)
+        with other:
+            other.execute("INSERT INTO tbl_wiki(page_id, title, search_word) VALUES(3, 'Gamma', 'gamma')")
+            other.execute("INSERT INTO tbl_wiki_alias(alias, wiki_id) VALUES('g', 3)")
+            other.execute("INSERT INTO tbl_wiki_failed(search_word, reason, expires_at) "
+                          "VALUES('y', 'missing', datetime('now', '+60 seconds'))")
+        other.close()
+
+        self.assertEqual(self.repo.missing_search_words(['alpha', 'beta', 'gamma', 'g', 'y', 'delta']), ['delta'])
+
+    def test_reused_rowids_after_deletes_are_found(self):
+        self.repo.insert_many([(2, 'Beta', 'second', 'beta')])
+        self.repo.insert_aliases([('a', 1), ('b', 2)])
+        self.assertEqual(self.repo.missing_search_words(['a', 'b']), [])
+
+        # The last alias is deleted with its row, the next one gets its rowid again.
+        self.repo.delete((2,))
+        self.assertEqual(self.repo.missing_search_words(['a', 'b', 'beta']), ['b', 'beta'])
+
+        self.repo.insert_aliases([('c', 1)])
+        self.assertEqual(self.repo.missing_search_words(['a', 'c']), [])
+
+    def test_full_filter_is_rebuilt(self):
+        capacity = self.repo.bloom.capacity
+        self.repo.insert_many([(page_id, 'Title {}'.format(page_id), None, 'word {}'.format(page_id))
+                               for page_id in range(2, capacity + 2)])
+
+        self.assertEqual(self.repo.missing_search_words(['word 2', 'word {}'.format(capacity + 1)]), [])
+        self.assertGreater(self.repo.bloom.capacity, capacity)
+
+
+if __name__ == '__main__':
+    unittest.main()
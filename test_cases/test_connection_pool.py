@@ -0,0 +1,82 @@
+#!test_cases/test_connection_pool.py Python3
+"""
+Tests of ConnectionPool (repository/connection_pool.py): one pool per database, a connection per thread,
+and closing of all connections.
+
+Example:
+    python -m pytest test_cases/test_connection_pool.py
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from repository.connection_pool import ConnectionPool
+
+
+def _in_thread(function):
+    """Call function in a new thread and return its result."""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'test.db')
+        self.pool = ConnectionPool.get(self.path, on_create=lambda c: c.execute('CREATE TABLE t (x INTEGER)'))
+
+    def tearDown(self):
+        self.pool.close()
+        self.directory.cleanup()
+
+    def test_one_pool_per_database(self):
+        self.assertIs(ConnectionPool.get(self.path), self.pool)
+        memory_pools = [ConnectionPool.get(':memory:'), ConnectionPool.get(':memory:')]
+        self.assertIsNot(*memory_pools)
+        for pool in memory_pools:
+            pool.close()
+
+    def test_every_thread_gets_its_own_connection(self):
+        connection = self.pool.connection()
+        self.assertIs(self.pool.connection(), connection)
+        self.assertIs(self.pool.cursor().connection, connection)
+
+        other = _in_thread(self.pool.connection)
+        self.assertIsNot(other, connection)
+        self.assertEqual(connection.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+    def test_connections_of_finished_threads_are_closed(self):
+        finished = _in_thread(self.pool.connection)
+        _in_thread(self.pool.connection)
+
+        with self.assertRaises(sqlite3.ProgrammingError):
+            finished.execute('SELECT 1')
+
+    def test_close_closes_all_connections(self):
+        connections = [self.pool.connection(), _in_thread(self.pool.connection)]
+        self.pool.writer.flush()
+        self.pool.close()
+
+        for connection in connections:
+            with self.assertRaises(sqlite3.ProgrammingError):
+                connection.execute('SELECT 1')
+        reopened = ConnectionPool.get(self.path)
+        self.assertIsNot(reopened, self.pool)
+        reopened.close()
+
+    def test_threads_of_a_memory_database_share_it(self):
+        pool = ConnectionPool.get(':memory:', on_create=lambda c: c.execute('CREATE TABLE t (x INTEGER)'))
+        try:
+            pool.writer.submit(lambda c: c.execute('INSERT INTO t VALUES(1)')).result(timeout=10)
+            self.assertEqual(pool.connection().execute('SELECT COUNT(*) FROM t').fetchone()[0], 1)
+        finally:
+            pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#!test_cases/test_dump_import.py Python3
+"""
+Tests of DumpImporter (repository/dump_import.py) with a small pages-articles dump.
+
+Example:
+    python -m pytest test_cases/test_dump_import.py
+"""
+import bz2
+import os
+import stat
+import subprocess
+import unittest
+from unittest import mock
+from repository.dump_import import DumpImporter
+from test_cases.support import RepositoryTestCase
+
+DUMP = b"""<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/">
+<page><title>Python</title><ns>0</ns><id>5</id>
+<revision><text>'''Python''' is a programming language. It was created by Guido van Rossum.</text></revision></page>
+<page><title>Py</title><ns>0</ns><id>6</id><redirect title="Python" />
+<revision><text>#REDIRECT [[Python]]</text></revision></page>
+<page><title>Talk:Python</title><ns>1</ns><id>7</id><revision><text>Talk.</text></revision></page>
+</mediawiki>
+"""
+
+
+class DumpImporterTest(RepositoryTestCase):
+
+    def _write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as file:
+            file.write(data)
+        return path
+
+    def _tool(self, exit_code: int) -> str:
+        """Stand-in for lbzip2: writes the file as it is (not compressed) and exits with exit_code."""
+        path = self._write('fake_lbzip2', '#!/bin/sh\ncat "$2"\nexit {}\n'.format(exit_code).encode())
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        return path
+
+    def test_bz2_dump_is_imported(self):
+        stats = DumpImporter(self.repo, workers=0).run(self._write('dump.xml.bz2', bz2.compress(DUMP)))
+        self.assertEqual((stats['pages'], stats['articles'], stats['redirects']), (3, 1, 1))
+        self.assertEqual((stats['inserted'], stats['aliases']), (1, 1))
+        self.assertEqual(self.repo.missing_search_words(['Python', 'Py', 'Talk:Python']), ['Talk:Python'])
+
+    def test_decompressor_is_waited_for(self):
+        path = self._write('dump.xml.bz2', DUMP)
+        with mock.patch('repository.dump_import.shutil.which', return_value=self._tool(0)):
+            stats = DumpImporter(self.repo, workers=0).run(path)
+        self.assertEqual(stats['inserted'], 1)
+
+    def test_failed_decompressor_raises(self):
+        path = self._write('dump.xml.bz2', DUMP)
+        with mock.patch('repository.dump_import.shutil.which', return_value=self._tool(2)):
+            with self.assertRaises(subprocess.CalledProcessError) as context:
+                DumpImporter(self.repo, workers=0).run(path)
+        self.assertEqual(context.exception.returncode, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
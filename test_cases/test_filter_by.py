@@ -0,0 +1,92 @@
+#!test_cases/test_filter_by.py Python3
+"""
+Tests of Repository.filter_by (repository/db_setup.py): compiled SQL with bound parameters, escaping of wildcards,
+date ranges and the trigram path of 'Contains' and 'Ends with'.
+
+Example:
+    python -m pytest test_cases/test_filter_by.py
+"""
+import unittest
+from repository.db_setup import Repository
+from test_cases.support import RepositoryTestCase
+
+
+class FilterByTest(RepositoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.repo.insert_many([(1, 'Python', 'a language', 'python'),
+                               (2, 'Pythonidae', 'a family of snakes', 'pythonidae'),
+                               (3, "O'Brien", 'a surname', "o'brien"),
+                               (4, '100%_pure', 'a slogan', '100%_pure'),
+                               (5, '100 pure', 'another slogan', '100 pure')])
+
+    def _titles(self, field, criteria, value) -> list:
+        return sorted(row.title for row in self.repo.filter_by(field, criteria, value))
+
+    def test_sql_is_compiled_once_per_conditions(self):
+        Repository._compile_filter.cache_clear()
+        self._titles(('title',), ('Starts with',), ('Py',))
+        self._titles(('title',), ('Starts with',), ('O',))
+        self.assertEqual(Repository._compile_filter.cache_info().misses, 1)
+        self.assertEqual(Repository._compile_filter.cache_info().hits, 1)
+
+        sql = Repository._compile_filter((('title', 'Contains', True), ('created_date', 'Greater', False)))
+        self.assertEqual(sql.count('?'), 2)
+        self.assertNotIn('Py', sql)
+
+    def test_values_are_bound(self):
+        self.assertEqual(self._titles(('title',), ('Is equal to',), ("O'Brien",)), ["O'Brien"])
+        self.assertEqual(self._titles(('title',), ('Contains',), ("O'Brien' OR 1=1 --",)), [])
+        self.assertEqual(self._titles(('title',), ('Contains',), ("'Bri",)), ["O'Brien"])
+
+    def test_starts_with_is_case_insensitive_and_uses_an_index(self):
+        self.assertEqual(self._titles(('title',), ('Starts with',), ('pyth',)), ['Python', 'Pythonidae'])
+        sql = Repository._compile_filter((('title', 'Starts with', False),))
+        plan = ' '.join(row[3] for row in self.repo.connection.execute('EXPLAIN QUERY PLAN ' + sql, ('a', 'b', 'c')))
+        self.assertIn('idx_wiki_title_nocase', plan)
+
+    def test_exact_matches_are_case_sensitive_and_use_an_index(self):
+        self.assertEqual(self._titles(('title',), ('Is equal to',), ('Python',)), ['Python'])
+        self.assertEqual(self._titles(('title',), ('Is equal to',), ('python',)), [])
+        self.assertEqual([row.title for row in self.repo.find_by_title(('Python', 'PYTHON'))], ['Python'])
+        self.assertEqual(self.repo.missing_search_words(['python', 'Python']), ['Python'])
+
+        sql = Repository._compile_filter((('search_word', 'Is equal to', False),))
+        plan = ' '.join(row[3] for row in self.repo.connection.execute('EXPLAIN QUERY PLAN ' + sql, ('a', 'a')))
+        self.assertIn('idx_wiki_search_word_nocase', plan)
+
+    def test_wildcards_of_values_are_escaped(self):
+        self.assertEqual(self._titles(('title',), ('Starts with',), ('100%',)), ['100%_pure'])
+        self.assertEqual(self._titles(('search_word',), ('Contains',), ('%_',)), ['100%_pure'])
+        self.assertEqual(self._titles(('title',), ('Does not contain',), ('_',)),
+                         ['100 pure', "O'Brien", 'Python', 'Pythonidae'])
+
+    def test_trigram_and_like_paths_agree(self):
+        for criteria, value in [('Contains', 'thon'), ('Contains', 'hon'), ('Ends with', 'dae'), ('Contains', 'on')]:
+            trigram = len(value) >= 3
+            self.assertEqual(Repository._filter_params('title', criteria, value, trigram),
+                             Repository._filter_params('title', criteria, value, False))
+            self.assertEqual(self._titles(('title',), (criteria,), (value,)),
+                             sorted(t for t in ['Python', 'Pythonidae', "O'Brien", '100%_pure', '100 pure']
+                                    if (value in t if criteria == 'Contains' else t.endswith(value))))
+
+    def test_dates_are_ranges_of_days(self):
+        today = self.repo.connection.execute("SELECT date('now')").fetchone()[0]
+        self.assertEqual(len(self.repo.filter_by(('created_date',), ('Is equal to',), (today,))), 5)
+        self.assertEqual(len(self.repo.filter_by(('created_date',), ('Greater',), (today,))), 0)
+        self.assertEqual(len(self.repo.filter_by(('created_date',), ('Less',), (today,))), 0)
+        with self.assertRaises(ValueError):
+            self.repo.filter_by(('created_date',), ('Is equal to',), ('31.01.2020',))
+
+    def test_incorrect_arguments(self):
+        with self.assertRaises(ValueError):
+            self.repo.filter_by(('meaning; DROP TABLE tbl_wiki',), ('Is equal to',), ('x',))
+        with self.assertRaises(ValueError):
+            self.repo.filter_by(('title',), ('Sounds like',), ('x',))
+        with self.assertRaises(IndexError):
+            self.repo.filter_by(('title', 'meaning'), ('Contains',), ('x',))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!test_cases/test_group_writer.py Python3
+"""
+Tests of GroupWriter (repository/group_writer.py): group commit, isolation of a failing operation and recovery
+of the writer thread when a group can not be written at all.
+
+Example:
+    python -m pytest test_cases/test_group_writer.py
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from repository.connection_pool import ConnectionPool
+
+
+class GroupWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'test.db')
+        self.pool = ConnectionPool.get(self.path, on_create=lambda c: c.execute('CREATE TABLE t (x INTEGER UNIQUE)'))
+
+    def tearDown(self):
+        self.pool.close()
+        self.directory.cleanup()
+
+    def _count(self) -> int:
+        return self.pool.connection().execute('SELECT COUNT(*) FROM t').fetchone()[0]
+
+    def _hold_writer(self) -> threading.Event:
+        """Keep the writer thread busy until the returned event is set, so that submitted operations queue up."""
+        release = threading.Event()
+        self.pool.writer.max_delay = 10    # the queued operations join the group of the busy one
+        self.pool.writer.submit(lambda c: release.wait(10))
+        return release
+
+    def test_concurrent_operations_share_commits(self):
+        writer = self.pool.writer
+        release = self._hold_writer()
+
+        def submit(thread_no):
+            return [writer.submit(lambda c, x: c.execute('INSERT INTO t VALUES(?)', (x,)).rowcount, x)
+                    for x in range(thread_no * 50, (thread_no + 1) * 50)]
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [future for futures in executor.map(submit, range(4)) for future in futures]
+        release.set()
+
+        self.assertEqual([future.result(timeout=10) for future in futures], [1] * 200)
+        self.assertEqual(self._count(), 200)
+        self.assertEqual(writer.operations, 201)
+        self.assertLess(writer.commits, writer.operations)
+
+    def test_failing_operation_is_rolled_back_alone(self):
+        writer = self.pool.writer
+        release = self._hold_writer()
+
+        def insert_and_fail(c):
+            c.execute('INSERT INTO t VALUES(2)')
+            raise ValueError('failed after its insert')
+
+        first = writer.submit(lambda c: c.execute('INSERT INTO t VALUES(1)'))
+        failing = writer.submit(insert_and_fail)
+        duplicate = writer.submit(lambda c: c.execute('INSERT INTO t VALUES(1)'))
+        last = writer.submit(lambda c: c.execute('INSERT INTO t VALUES(3)'))
+        release.set()
+
+        first.result(timeout=10)
+        last.result(timeout=10)
+        self.assertIsInstance(failing.exception(timeout=10), ValueError)
+        self.assertIsInstance(duplicate.exception(timeout=10), sqlite3.IntegrityError)
+        self.assertEqual(writer.commits, 1)
+        rows = self.pool.connection().execute('SELECT x FROM t ORDER BY x').fetchall()
+        self.assertEqual([row[0] for row in rows], [1, 3])
+
+    def test_writer_survives_a_locked_database(self):
+        writer = self.pool.writer
+        writer.flush()
+
+        # Another process holds the write lock longer than the busy timeout of the writer.
+        blocker = sqlite3.connect(self.path, isolation_level=None)
+        writer.submit(lambda c: c.execute('PRAGMA busy_timeout = 100')).result(timeout=10)
+        blocker.execute('BEGIN IMMEDIATE')
+        try:
+            locked = writer.submit(lambda c: c.execute('INSERT INTO t VALUES(1)'))
+            self.assertIsInstance(locked.exception(timeout=10), sqlite3.OperationalError)
+        finally:
+            blocker.execute('ROLLBACK')
+            blocker.close()
+
+        writer.submit(lambda c: c.execute('INSERT INTO t VALUES(2)')).result(timeout=10)
+        self.assertEqual(self._count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
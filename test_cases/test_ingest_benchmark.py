@@ -0,0 +1,60 @@
+#!test_cases/test_ingest_benchmark.py Python3
+"""
+Tests of the ingest benchmark (test_cases/ingest_benchmark.py) and of FakeWikiServer (test_cases/fake_wiki_server.py).
+
+Example:
+    python -m pytest test_cases/test_ingest_benchmark.py
+"""
+import os
+import tempfile
+import threading
+import unittest
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from repository.connection_pool import ConnectionPool
+from test_cases.fake_wiki_server import FakeWikiServer
+from test_cases.ingest_benchmark import RecordedLatencies, run
+
+
+def _writer_threads() -> int:
+    return sum(thread.name == 'sqlite-writer' for thread in threading.enumerate())
+
+
+class IngestBenchmarkTest(unittest.TestCase):
+
+    def test_recorded_latencies_keep_their_bound(self):
+        latencies = RecordedLatencies(maxlen=3)
+        for latency in range(5):
+            latencies.append(latency)
+
+        self.assertEqual(list(latencies), [2, 3, 4])
+        self.assertEqual(latencies.all, [0, 1, 2, 3, 4])
+
+    def test_run(self):
+        writers = _writer_threads()
+        with FakeWikiServer() as server, tempfile.TemporaryDirectory() as directory:
+            db_path = os.path.join(directory, 'bench.db')
+            res = run(300, server.url, batch_size=100, max_workers=4, db_path=db_path)
+
+            self.assertNotIn(db_path, ConnectionPool._pools)
+        self.assertEqual(res['succeed'] + res['failed'], 300)
+        self.assertGreater(res['chunk'][0], 0)
+        self.assertEqual(_writer_threads(), writers)
+
+    def test_concurrent_requests_are_counted(self):
+        with FakeWikiServer() as server:
+            url = server.url + '?' + urlencode({'action': 'query', 'format': 'json', 'titles': 'Article 1'})
+
+            def get(_):
+                with urllib.request.urlopen(url) as response:
+                    return response.status
+
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                self.assertEqual(list(executor.map(get, range(200))), [200] * 200)
+
+            self.assertEqual(server.requests, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
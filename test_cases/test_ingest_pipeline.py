@@ -0,0 +1,55 @@
+#!test_cases/test_ingest_pipeline.py Python3
+"""
+Tests of the ingest journal of IngestPipeline (api/ingest_pipeline.py): recorded batches are skipped when a job
+is resumed, batches with words that could not be requested are not recorded. MediaWiki is replaced by a fake.
+
+Example:
+    python -m pytest test_cases/test_ingest_pipeline.py
+"""
+import unittest
+from api.wiki_service import WikiService
+from test_cases.support import FakeWikiHttp, RepositoryTestCase
+
+
+class IngestJournalTest(RepositoryTestCase):
+
+    WORDS = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta']
+
+    def _ingest(self, wiki_http, resume=False) -> dict:
+        service = WikiService(wiki_http=wiki_http, repo=self.repo)
+        return service.ingest(IngestJournalTest.WORDS, batch_size=2, fetchers=1, job='words', resume=resume)
+
+    def test_recorded_batches_are_skipped_on_resume(self):
+        stats = self._ingest(FakeWikiHttp())
+        self.assertEqual((stats['batches'], stats['written'], stats['unrecorded']), (3, 6, 0))
+        self.assertEqual(self.repo.completed_batches('words'), {0, 1, 2})
+
+        wiki_http = FakeWikiHttp()
+        stats = self._ingest(wiki_http, resume=True)
+        self.assertEqual((stats['resumed'], stats['batches']), (3, 0))
+        self.assertEqual(wiki_http.requested, [])
+
+    def test_batch_with_failed_requests_is_not_recorded(self):
+        stats = self._ingest(FakeWikiHttp(rejected=['Gamma']))
+        self.assertEqual((stats['batches'], stats['written'], stats['unrecorded']), (3, 5, 1))
+        self.assertEqual(self.repo.completed_batches('words'), {0, 2})
+        self.assertEqual(self.repo.missing_search_words(['Gamma', 'Delta']), ['Gamma'])
+
+        # Only the failed word of the unrecorded batch is requested again.
+        wiki_http = FakeWikiHttp()
+        stats = self._ingest(wiki_http, resume=True)
+        self.assertEqual(wiki_http.requested, ['Gamma'])
+        self.assertEqual((stats['resumed'], stats['written'], stats['unrecorded']), (2, 1, 0))
+        self.assertEqual(self.repo.completed_batches('words'), {0, 1, 2})
+
+    def test_job_can_not_be_restarted_or_resumed_with_another_batch_size(self):
+        self._ingest(FakeWikiHttp())
+        with self.assertRaises(ValueError):
+            self._ingest(FakeWikiHttp())
+        with self.assertRaises(ValueError):
+            WikiService(wiki_http=FakeWikiHttp(), repo=self.repo).ingest(IngestJournalTest.WORDS, batch_size=3,
+                                                                        job='words', resume=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+#!test_cases/test_normalization.py Python3
+"""
+Tests of normalize_titles (api/normalization.py).
+
+Example:
+    python -m pytest test_cases/test_normalization.py
+"""
+import unittest
+from api.normalization import normalize_title, normalize_titles
+
+
+class NormalizationTest(unittest.TestCase):
+
+    def test_words_are_normalized_like_mediawiki(self):
+        self.assertEqual(normalize_title('python_programming'), 'Python programming')
+        self.assertEqual(normalize_title(' Python \t programming_ '), 'Python programming')
+        self.assertEqual(normalize_title('iPhone'), 'IPhone')
+        self.assertEqual(normalize_title('éclair'), 'Éclair')
+        self.assertEqual(normalize_title(' _ '), '')
+
+    def test_titles_are_unique_in_order_and_blank_words_are_dropped(self):
+        words = ['python_programming', ' Python  programming', '', 'Python', 'python', '   ']
+        titles, mapping = normalize_titles(words)
+
+        self.assertEqual(titles, ['Python programming', 'Python'])
+        self.assertEqual(mapping, {'python_programming': 'Python programming',
+                                   ' Python  programming': 'Python programming',
+                                   'Python': 'Python', 'python': 'Python'})
+
+    def test_single_word(self):
+        self.assertEqual(normalize_titles('algebra'), (['Algebra'], {'algebra': 'Algebra'}))
+        self.assertEqual(normalize_titles([]), ([], {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!test_cases/test_rate_limiter.py Python3
+"""
+Tests of RateLimiter (api/rate_limiter.py): AIMD backoff and recovery of the rate, token bucket and Retry-After.
+The clock is mocked.
+
+Example:
+    python -m pytest test_cases/test_rate_limiter.py
+"""
+import unittest
+from unittest import mock
+from api.rate_limiter import RateLimiter
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch('api.rate_limiter.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rate_backs_off_and_recovers(self):
+        limiter = RateLimiter(rate=20, min_rate=1, max_rate=22, increase=0.5, decrease=0.5)
+
+        limiter.throttle()
+        self.assertEqual(limiter.rate, 10)
+        for _ in range(5):
+            limiter.throttle()
+        self.assertEqual(limiter.rate, 1)
+
+        for _ in range(4):
+            limiter.success()
+        self.assertEqual(limiter.rate, 3)
+        for _ in range(100):
+            limiter.success()
+        self.assertEqual(limiter.rate, 22)
+
+    def test_requests_above_the_burst_wait_for_tokens(self):
+        limiter = RateLimiter(rate=10, burst=2)
+
+        self.assertEqual([limiter.reserve() for _ in range(2)], [0.0, 0.0])
+        self.assertAlmostEqual(limiter.reserve(), 0.1)
+        self.now += 1
+        self.assertEqual(limiter.reserve(), 0.0)
+
+    def test_retry_after_blocks_all_requests(self):
+        limiter = RateLimiter(rate=10, burst=10)
+
+        limiter.throttle(retry_after=3)
+        self.assertAlmostEqual(limiter.reserve(), 3)
+        self.now += 2
+        self.assertAlmostEqual(limiter.reserve(), 1)
+        self.now += 1
+        self.assertEqual(limiter.reserve(), 0.0)
+
+    def test_backoff_is_capped(self):
+        self.assertTrue(all(0 <= RateLimiter.backoff(attempt, base=0.5, cap=4) <= 4 for attempt in range(10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#!test_cases/test_repository.py Python3
+"""
+Tests of the writes of Repository (repository/db_setup.py).
+
+Example:
+    python -m pytest test_cases/test_repository.py
+"""
+import threading
+import unittest
+from repository.db_setup import Repository
+from test_cases.support import RepositoryTestCase
+
+
+class RepositoryTest(RepositoryTestCase):
+
+    def test_upsert_counts_rows_not_trigger_changes(self):
+        rows = [(1, 'Alpha', 'first', 'alpha'), (2, 'Beta', 'second', 'beta'), (3, 'Gamma', 'third', 'gamma')]
+        self.assertEqual(self.repo.insert_many(rows), {'inserted': 3, 'updated': 0, 'skipped': 0, 'invalid': 0})
+        self.assertEqual(self.repo.insert_many(rows), {'inserted': 0, 'updated': 0, 'skipped': 3, 'invalid': 0})
+
+        rows[1] = (2, 'Beta', 'changed', 'beta')
+        rows.append((4, 'Delta', 'fourth', 'delta'))
+        self.assertEqual(self.repo.insert_many(rows), {'inserted': 1, 'updated': 1, 'skipped': 2, 'invalid': 0})
+
+    def test_repeated_rows_do_not_use_up_ids(self):
+        rows = [(1, 'Alpha', 'first', 'alpha'), (2, 'Beta', 'second', 'beta')]
+        self.repo.insert_many(rows)
+        self.repo.insert_many(rows)
+        self.repo.insert_many([(2, 'Beta', 'changed', 'beta'), (3, 'Gamma', 'third', 'gamma')])
+
+        ids = self.repo.connection.execute('SELECT tbl_id FROM tbl_wiki ORDER BY tbl_id').fetchall()
+        self.assertEqual([row[0] for row in ids], [1, 2, 3])
+
+    def test_invalid_rows_are_left_out(self):
+        rows = [(1, 'Alpha', 'first', 'alpha'), (2, '', 'no title', 'beta'), (-3, 'Gamma', 'third', 'gamma'),
+                (4, 'Delta', 'fourth', 'delta')]
+        self.assertEqual(self.repo.insert_many(rows), {'inserted': 2, 'updated': 0, 'skipped': 0, 'invalid': 2})
+        self.assertEqual(self.repo.connection.execute('SELECT COUNT(*) FROM tbl_wiki').fetchone()[0], 2)
+
+    def test_alias_and_failed_counts(self):
+        self.repo.insert_many([(1, 'Alpha', 'first', 'alpha')])
+        self.assertEqual(self.repo.insert_aliases([('a', 1), ('alpha', 1), ('b', 2)]), 1)
+        self.assertEqual(self.repo.insert_aliases([('a', 1)]), 0)
+        self.assertEqual(self.repo.insert_failed([('x', 'X', 'missing', -1), ('y', None, 'invalid', -2)], 60), 2)
+        self.assertEqual(self.repo.insert_failed([('x', 'X', 'missing', -1)], 60), 1)
+
+    def test_aliases_staged_by_another_thread_are_resolved(self):
+        self.repo.insert_many([(1, 'Alpha', 'first', 'alpha'), (2, 'Beta', 'second', 'beta')])
+
+        # The staging table lives on the writer connection, not on the connection of the staging thread.
+        thread = threading.Thread(target=self.repo.stage_aliases,
+                                  args=([('a', 'Alpha'), ('b', 'Beta'), ('c', 'Gamma'), ('alpha', 'Alpha')],))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(self.repo.resolve_staged_aliases(), 2)
+        self.assertEqual(self.repo.resolve_staged_aliases(), 0)
+
+    def test_fetch_modes(self):
+        self.repo.insert_many([(1, 'Alpha', 'first', 'alpha'), (2, 'Beta', 'second', 'beta')])
+
+        rows = self.repo.find_all()
+        self.assertEqual([(row.page_id, row.title) for row in rows], [(1, 'Alpha'), (2, 'Beta')])
+        self.assertEqual([row[1:5] for row in self.repo.find_all(fetch='tuple')],
+                         [(1, 'Alpha', 'alpha', 'first'), (2, 'Beta', 'beta', 'second')])
+
+        columns = self.repo.find_by_page_id((2, 1), fetch='columns')
+        self.assertEqual(list(columns), list(Repository._FILTER_FIELDS))
+        self.assertEqual(sorted(columns['title']), ['Alpha', 'Beta'])
+        self.assertEqual(self.repo.find_by_title(('Gamma',), fetch='columns'),
+                         {field: [] for field in Repository._FILTER_FIELDS})
+
+        with self.assertRaises(ValueError):
+            self.repo.find_all(fetch='dict')
+        with self.assertRaises(ValueError):
+            Repository(':memory:', fetch='dict')
+
+    def test_find_by_more_values_than_the_variable_limit(self):
+        self.repo.insert_many([(page_id, 'Title {}'.format(page_id), None, 'word {}'.format(page_id))
+                               for page_id in range(1, 2501)])
+        rows = self.repo.find_by_page_id(tuple(range(1, 2501)), fetch='tuple')
+        self.assertEqual(len(rows), 2500)
+
+
+if __name__ == '__main__':
+    unittest.main()
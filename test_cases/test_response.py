@@ -0,0 +1,101 @@
+#!test_cases/test_response.py Python3
+"""
+Tests of parsing of MediaWiki JSON (api/response.py): ResponseParser, its lazy iter_responses and ResponseBatch.
+
+Example:
+    python -m pytest test_cases/test_response.py
+"""
+import copy
+import gc
+import unittest
+from api.response import (Response, ResponseParser, ResponseBatch, SuccessfulResponse, MissingResponse,
+                          InvalidResponse, DisambiguationResponse, FailedRequestResponse, UnknownResponse)
+from api.wiki_http import WikiHttp
+
+# The example of api/wiki_http.py, requested words: 'Python Programming', 'This is missing',
+# '[]This[]is[]invalid[]', 'Python'.
+JSON = {'batchcomplete': '',
+        'query': {'pageids': ['-2', '-1', '46332325', '23862'],
+                  'pages': {'-1': {'invalid': '', 'invalidreason': 'The requested page title contains invalid '
+                                                                   'characters: "[".',
+                                   'title': '[]This[]is[]invalid[]'},
+                            '-2': {'missing': '', 'ns': 0, 'title': 'This is missing'},
+                            '23862': {'extract': 'Python is an interpreted, high-level programming language.',
+                                      'ns': 0, 'pageid': 23862, 'title': 'Python (programming language)'},
+                            '46332325': {'extract': 'Python may refer to:', 'ns': 0, 'pageid': 46332325,
+                                         'pageprops': {'disambiguation': ''}, 'title': 'Python'}},
+                  'redirects': [{'from': 'Python Programming', 'to': 'Python (programming language)'}]}}
+
+
+class ResponseParserTest(unittest.TestCase):
+
+    def test_pages_are_identified(self):
+        parser = ResponseParser(JSON)
+        self.assertEqual([type(response) for response in parser],
+                         [MissingResponse, InvalidResponse, DisambiguationResponse, SuccessfulResponse])
+        self.assertEqual(parser[3].search_word, 'Python Programming')
+        self.assertEqual(parser[3].meaning, 'Python is an interpreted, high-level programming language.')
+
+    def test_lazy_parser_yields_the_same_responses(self):
+        json = copy.deepcopy(JSON)
+        self.assertEqual([repr(response) for response in ResponseParser.iter_responses(json)],
+                         [repr(response) for response in ResponseParser(JSON)])
+        self.assertEqual(json, JSON)
+
+    def test_batch_agrees_with_the_parser(self):
+        batch = ResponseBatch(JSON)
+        self.assertEqual([repr(response) for response in batch.responses()],
+                         [repr(response) for response in ResponseParser(JSON)])
+        self.assertEqual(list(batch.rows(SuccessfulResponse)),
+                         [(23862, 'Python (programming language)',
+                           'Python is an interpreted, high-level programming language.', 'Python Programming')])
+        self.assertEqual(list(batch.failed_rows()),
+                         [('This is missing', 'This is missing', 'missing', -2),
+                          ('[]This[]is[]invalid[]', '[]This[]is[]invalid[]', 'invalid', -1),
+                          ('Python', 'Python', 'disambiguation', 46332325)])
+
+    def test_failed_request_is_not_remembered(self):
+        batch = ResponseBatch(WikiHttp._failed_page('Python', 'HTTP 503'))
+        self.assertEqual(batch.select(FailedRequestResponse), [0])
+        self.assertEqual(list(batch.failed_rows()), [])
+
+    def test_classes_are_dispatched_by_sign_and_marker(self):
+        self.assertIs(Response.identify(-1, {'title': 'x', 'missing': ''}), MissingResponse)
+        self.assertIs(Response.identify(-1, {'title': 'x', 'invalid': '', 'invalidreason': 'x'}), InvalidResponse)
+        self.assertIs(Response.identify(-1, {'title': 'x', 'invalid': '', 'invalidreason': 'x', 'requestfailed': ''}),
+                      FailedRequestResponse)
+        self.assertIs(Response.identify(5, {'title': 'x', 'pageprops': {}}), DisambiguationResponse)
+        self.assertIs(Response.identify(5, {'title': 'x'}), SuccessfulResponse)
+        self.assertIs(Response.identify(-1, {'title': 'x'}), UnknownResponse)
+
+    def test_new_subclass_extends_the_dispatch(self):
+        class ProtectedResponse(Response):
+            __slots__ = ()
+            positive = False
+            marker = 'protection'
+
+        page = {'title': 'x', 'protection': []}
+        try:
+            self.assertIs(Response.identify(-1, page), ProtectedResponse)
+            batch = ResponseBatch({'query': {'pageids': ['-1'], 'pages': {'-1': page}}})
+            self.assertIsInstance(batch.responses()[0], ProtectedResponse)
+        finally:
+            # The class stays a subclass of Response until it is collected.
+            del ProtectedResponse, batch
+            gc.collect()
+
+    def test_search_word_is_the_sent_word(self):
+        json = {'query': {'pageids': ['7'],
+                          'normalized': [{'from': 'python_programming', 'to': 'Python programming'}],
+                          'redirects': [{'from': 'Python programming', 'to': 'Python (programming language)'}],
+                          'pages': {'7': {'pageid': 7, 'title': 'Python (programming language)', 'extract': 'x'}}}}
+        self.assertEqual(ResponseParser(json)[0].search_word, 'python_programming')
+
+        batch = ResponseBatch(json)
+        self.assertEqual(batch.search_words, ['python_programming'])
+        self.assertEqual(list(batch.alias_rows()), [('python_programming', 7), ('Python (programming language)', 7),
+                                                    ('Python programming', 7)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#!test_cases/test_response_cache.py Python3
+"""
+Tests of ResponseCache (api/response_cache.py): TTL expiry, LRU eviction and replay mode. The clock is mocked.
+
+Example:
+    python -m pytest test_cases/test_response_cache.py
+"""
+import unittest
+from unittest import mock
+from api.response_cache import ResponseCache, CacheMissError
+
+PARAMS = {'action': 'query', 'format': 'json'}
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('api.response_cache.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _put(self, cache: ResponseCache, *titles) -> None:
+        for title in titles:
+            self.now += 1
+            cache.put_many({title: {'title': title}}, PARAMS)
+
+    def test_expired_entries_are_misses(self):
+        cache = ResponseCache(ttl=60)
+        self._put(cache, 'Python')
+
+        self.now += 60
+        self.assertEqual(cache.get_many(['python'], PARAMS), {'python': {'title': 'Python'}})
+        self.now += 1
+        self.assertEqual(cache.get_many(['Python'], PARAMS), {})
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ResponseCache(max_entries=3)
+        self._put(cache, 'Alpha', 'Beta', 'Gamma')
+
+        self.now += 1
+        cache.get_many(['Alpha'], PARAMS)
+        self._put(cache, 'Delta')
+
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(set(cache.get_many(['Alpha', 'Beta', 'Gamma', 'Delta'], PARAMS)), {'Alpha', 'Gamma', 'Delta'})
+
+    def test_replay_raises_on_a_miss(self):
+        cache = ResponseCache(replay=True)
+        self._put(cache, 'Python')
+
+        self.assertEqual(cache.get_many(['Python'], PARAMS), {'Python': {'title': 'Python'}})
+        with self.assertRaises(CacheMissError):
+            cache.get_many(['Python', 'Algebra'], PARAMS)
+
+
+if __name__ == '__main__':
+    unittest.main()
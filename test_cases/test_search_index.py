@@ -0,0 +1,59 @@
+#!test_cases/test_search_index.py Python3
+"""
+Tests of the full-text indexes of Repository (repository/db_setup.py): search, trigram filters with bound values
+and the deferred index of bulk loads.
+
+Example:
+    python -m pytest test_cases/test_search_index.py
+"""
+import unittest
+from repository.db_setup import Repository
+from test_cases.support import RepositoryTestCase
+
+
+class SearchIndexTest(RepositoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        if not self.repo.full_text:
+            self.skipTest('SQLite without FTS5 trigram tokenizer')
+        self.repo.insert_many([(1, 'Python', 'a programming language', 'python'),
+                               (2, "O'Brien", 'a surname', "o'brien")])
+
+    def _titles(self, rows) -> list:
+        return sorted(row.title for row in rows)
+
+    def test_trigram_values_are_bound(self):
+        sql = Repository._compile_filter((('title', 'Contains', True),))
+        self.assertIn('tbl_wiki_trigram', sql)
+        self.assertNotIn("Bri", sql)
+        self.assertEqual(self._titles(self.repo.filter_by(('title',), ('Contains',), ("'Bri",))), ["O'Brien"])
+        self.assertEqual(self.repo.filter_by(('title',), ('Contains',), ("x') OR 1=1 OR ('",)), [])
+
+    def test_deferred_index_is_rebuilt_at_the_end(self):
+        with self.repo.deferred_search_index():
+            self.assertFalse(self.repo.full_text)
+            self.repo.insert_many([(3, 'Pythonidae', 'a family of snakes', 'pythonidae')])
+            self.repo.delete((1,))
+            # Without the index filters fall back to LIKE and still see the new rows.
+            self.assertEqual(self._titles(self.repo.filter_by(('title',), ('Contains',), ('thon',))), ['Pythonidae'])
+
+        self.assertTrue(self.repo.full_text)
+        self.assertEqual(self._titles(self.repo.search('snakes')), ['Pythonidae'])
+        self.assertEqual(self.repo.search('programming'), [])
+        self.assertEqual(self._titles(self.repo.filter_by(('title',), ('Contains',), ('thon',))), ['Pythonidae'])
+
+        self.repo.insert_many([(4, 'Pythonism', 'a snakes fan club', 'pythonism')])
+        self.assertEqual(self._titles(self.repo.search('snakes')), ['Pythonidae', 'Pythonism'])
+
+    def test_index_of_an_unfinished_load_is_rebuilt_on_open(self):
+        self.repo._write(Repository._drop_search_triggers)
+        self.repo.insert_many([(3, 'Pythonidae', 'a family of snakes', 'pythonidae')])
+        self.repo.pool.close()
+
+        self.repo = Repository(self.path)
+        self.assertEqual(self._titles(self.repo.search('snakes')), ['Pythonidae'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#!test_cases/test_wiki_http.py Python3
+"""
+Tests of WikiHttp (api/wiki_http.py): handling of failed requests (_request is replaced, no network),
+continuation of responses and the size of the connection pool.
+
+Example:
+    python -m pytest test_cases/test_wiki_http.py
+"""
+import unittest
+from api.wiki_http import WikiHttp
+from test_cases.fake_wiki_server import FakeWikiServer
+from test_cases.support import FakeWikiHttp
+
+
+def _failed_titles(js: dict) -> set:
+    return {page['title'] for page in js['query']['pages'].values() if 'requestfailed' in page}
+
+
+class WikiHttpTest(unittest.TestCase):
+
+    def test_rejected_word_is_isolated_by_bisection(self):
+        http = FakeWikiHttp(rejected=['bad'])
+        words = ['w{}'.format(i) for i in range(7)] + ['bad']
+
+        js = http.get(words)
+        self.assertEqual(_failed_titles(js), {'bad'})
+        self.assertEqual(len(js['query']['pages']), 8)
+
+    def test_exhausted_retries_fail_the_chunk_without_bisection(self):
+        http = FakeWikiHttp(unavailable=True)
+        words = ['w{}'.format(i) for i in range(8)]
+
+        js = http.get(words)
+        self.assertEqual(_failed_titles(js), set(words))
+        self.assertEqual(http.requests, 1)
+
+    def test_connection_pool_holds_the_hedge_threads(self):
+        for hedge, maxsize in ((True, 10), (False, 8)):
+            with WikiHttp(max_workers=8, hedge=hedge) as http:
+                adapter = http.session.get_adapter(http.url)
+                self.assertEqual(adapter.poolmanager.connection_pool_kw['maxsize'], maxsize)
+
+    def test_continued_response_is_merged(self):
+        js = {'continue': {'excontinue': 1, 'continue': '||pageprops'},
+              'query': {'pageids': ['1', '2'],
+                        'pages': {'1': {'pageid': 1, 'title': 'Alpha', 'extract': 'Alpha is first.'},
+                                  '2': {'pageid': 2, 'title': 'Beta', 'pageprops': {'wikibase_item': 'Q2'}}}}}
+        continued = {'batchcomplete': '',
+                     'query': {'pages': {'1': {'pageid': 1, 'title': 'Alpha', 'extract': 'Replaced.'},
+                                         '2': {'pageid': 2, 'title': 'Beta', 'extract': 'Beta is second.',
+                                               'pageprops': {'disambiguation': ''}}}}}
+
+        merged = WikiHttp._merge_continued(js, continued)
+        self.assertEqual(merged['query']['pages']['1']['extract'], 'Alpha is first.')
+        self.assertEqual(merged['query']['pages']['2'], {'pageid': 2, 'title': 'Beta', 'extract': 'Beta is second.',
+                                                         'pageprops': {'wikibase_item': 'Q2', 'disambiguation': ''}})
+        self.assertNotIn('continue', merged)
+        self.assertEqual(merged['batchcomplete'], '')
+
+    def test_continuation_keeps_the_next_continue(self):
+        js = {'continue': {'excontinue': 20}, 'query': {'pages': {'1': {'pageid': 1}}}}
+        merged = WikiHttp._merge_continued(js, {'continue': {'excontinue': 40}, 'query': {'pages': {}}})
+        self.assertEqual(merged['continue'], {'excontinue': 40})
+        self.assertNotIn('batchcomplete', merged)
+
+    def test_all_extracts_of_a_chunk_are_continued(self):
+        words = ['Article {}'.format(i) for i in range(45)]
+        with FakeWikiServer() as server, WikiHttp(url=server.url, hedge=False) as http:
+            js = http.get(words)
+
+        pages = js['query']['pages'].values()
+        self.assertEqual(len(pages), 45)
+        self.assertTrue(all(page.get('extract') for page in pages))
+        self.assertNotIn('continue', js)
+
+
+if __name__ == '__main__':
+    unittest.main()
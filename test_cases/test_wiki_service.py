@@ -0,0 +1,57 @@
+#!test_cases/test_wiki_service.py Python3
+"""
+Tests of WikiService (api/wiki_service.py) against FakeWikiServer.
+
+Example:
+    python -m pytest test_cases/test_wiki_service.py
+"""
+import unittest
+from api.wiki_http import WikiHttp
+from api.wiki_service import WikiService
+from test_cases.fake_wiki_server import FakeWikiServer
+from test_cases.support import RepositoryTestCase
+
+
+class WikiServiceTest(RepositoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.server = FakeWikiServer()
+        self.server.start()
+        self.service = WikiService(wiki_http=WikiHttp(chunk_size=2, url=self.server.url, hedge=False),
+                                   repo=self.repo)
+
+    def tearDown(self):
+        self.service.wiki_http.close()
+        self.server.stop()
+
+    def test_redirects_of_a_later_chunk_are_saved(self):
+        words = ['Python', 'Java', 'Redirect Python', 'Redirect Java']
+        succeed, failed = self.service.get_meanings_from_wiki(words)
+
+        self.assertEqual(([response.title for response in succeed], failed), (['Python', 'Java'], []))
+        # Chunks arrive in any order, the words of the chunk saved first are the search words.
+        resolved = self.repo.resolve_search_words(words)
+        self.assertEqual({word: row.title for word, row in resolved.items()},
+                         {'Python': 'Python', 'Java': 'Java', 'Redirect Python': 'Python', 'Redirect Java': 'Java'})
+        self.assertEqual(self.repo.connection.execute('SELECT COUNT(*) FROM tbl_wiki_alias').fetchone()[0], 2)
+        self.assertEqual(self.service.check_database(words), [])
+
+    def test_all_tiers_return_the_same_page_ids(self):
+        words = ['Python', 'Ambiguous word', 'Missing word']
+        responses, stats = self.service.lookup_many(words)
+        self.assertEqual(stats['network'], 3)
+        page_ids = [response.page_id for response in responses]
+
+        responses, stats = self.service.lookup_many(words)
+        self.assertEqual(stats['memory'], 3)
+        self.assertEqual([response.page_id for response in responses], page_ids)
+
+        self.service.memory_cache.clear()
+        responses, stats = self.service.lookup_many(words)
+        self.assertEqual(stats['database'], 3)
+        self.assertEqual([response.page_id for response in responses], page_ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
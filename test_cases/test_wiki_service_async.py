@@ -0,0 +1,62 @@
+#!test_cases/test_wiki_service_async.py Python3
+"""
+Tests of the async methods of WikiService (api/wiki_service.py) against FakeWikiServer.
+
+Example:
+    python -m pytest test_cases/test_wiki_service_async.py
+"""
+import asyncio
+import threading
+import unittest
+from api.async_wiki_http import aiohttp
+from api.response import SuccessfulResponse, MissingResponse
+from api.wiki_http import WikiHttp
+from api.wiki_service import WikiService
+from test_cases.fake_wiki_server import FakeWikiServer
+from test_cases.support import RepositoryTestCase
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class WikiServiceAsyncTest(RepositoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.server = FakeWikiServer()
+        self.server.start()
+        self.service = WikiService(wiki_http=WikiHttp(url=self.server.url), repo=self.repo)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_lazy_client_is_reused_and_closed(self):
+        async def run():
+            async with self.service as service:
+                succeed, failed = await service.get_meanings_from_wiki_async(['Python', 'Missing word'])
+                session = service._async_wiki_http.session
+                await service.get_meanings_from_wiki_async(['Java'])
+                self.assertIs(service._async_wiki_http.session, session)
+            return succeed, failed, session
+
+        succeed, failed, session = asyncio.run(run())
+        self.assertEqual([(type(r), r.title) for r in succeed], [(SuccessfulResponse, 'Python')])
+        self.assertEqual([type(r) for r in failed], [MissingResponse])
+        self.assertTrue(session.closed)
+        self.assertIsNone(self.service._async_wiki_http)
+        self.assertEqual(self.service.check_database(['Python', 'Java', 'Missing word', 'Ruby']), ['Ruby'])
+
+    def test_check_database_does_not_run_on_the_loop_thread(self):
+        threads = []
+        check_database = self.service.check_database
+
+        def recorded(words):
+            threads.append(threading.current_thread())
+            return check_database(words)
+
+        self.service.check_database = recorded
+
+        self.assertEqual(asyncio.run(self.service.check_database_async(['Python'])), ['Python'])
+        self.assertIsNot(threads[0], threading.main_thread())
+
+
+if __name__ == '__main__':
+    unittest.main()
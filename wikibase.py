@@ -0,0 +1,85 @@
+#!wikibase.py Python3
+"""
+Command line entry point of WikiBase for bulk work without the GUI.
+
+    ingest: import a words file (one word per line) through WikiService.ingest.
+        Every import is a job in the ingest journal (named by the path of the file unless --job is given),
+        so an interrupted import is continued with --resume: batches that were already saved are not
+        requested from MediaWiki again.
+    jobs: list ingest jobs and their progress.
+
+Example:
+    python wikibase.py ingest test_cases/words
+    python wikibase.py ingest test_cases/words --resume
+    python wikibase.py jobs
+"""
+import argparse
+import pathlib
+import sys
+from api.wiki_http import WikiHttp
+from api.wiki_service import WikiService
+from api.response_cache import ResponseCache
+from repository.db_setup import Repository
+from constants import DB_PATH, HTTP_CACHE_PATH, HTTP_CACHE_TTL
+
+
+def _print_progress(stats, batch):
+    print('\r{words} words read, {batches} batches done, {succeed} succeed, {failed} failed, {written} saved'
+          .format(**stats), end='', file=sys.stderr, flush=True)
+
+
+def ingest(args) -> int:
+    cache = None if args.no_cache else ResponseCache(HTTP_CACHE_PATH, ttl=HTTP_CACHE_TTL)
+    service = WikiService(wiki_http=WikiHttp(cache=cache), repo=Repository(args.db))
+    job = args.job or str(pathlib.Path(args.path).resolve())
+
+    with open(args.path, 'r') as file:
+        try:
+            stats = service.ingest(file, batch_size=args.batch_size, fetchers=args.fetchers,
+                                   progress=_print_progress, job=job, resume=args.resume)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+        except KeyboardInterrupt:
+            print('\nInterrupted. Run the same command with --resume to continue.', file=sys.stderr)
+            return 130
+
+    print(file=sys.stderr)
+    for stage in stats.pop('stages').values():
+        print(stage)
+    print(stats)
+    return 0
+
+
+def jobs(args) -> int:
+    print('{:<50} {:>10} {:>8} {:>8} {:>8} {:>8}  {}'.format('job', 'batch_size', 'batches', 'succeed', 'failed',
+                                                             'saved', 'finished'))
+    for job in Repository(args.db).find_ingest_jobs():
+        print('{:<50} {:>10} {:>8} {:>8} {:>8} {:>8}  {}'.format(job.job, job.batch_size, job.batches, job.succeed,
+                                                                 job.failed, job.written, job.finished_date or '-'))
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='wikibase', description='WikiBase command line')
+    parser.add_argument('--db', default=DB_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_ingest = commands.add_parser('ingest', help='import a words file')
+    parser_ingest.add_argument('path', help='file with one word per line')
+    parser_ingest.add_argument('--job', help='name of the job in the ingest journal, default=path of the file')
+    parser_ingest.add_argument('--resume', action='store_true', help='continue an interrupted job')
+    parser_ingest.add_argument('--batch-size', type=int, default=500)
+    parser_ingest.add_argument('--fetchers', type=int, default=2)
+    parser_ingest.add_argument('--no-cache', action='store_true', help='do not use the HTTP response cache')
+    parser_ingest.set_defaults(func=ingest)
+
+    parser_jobs = commands.add_parser('jobs', help='list ingest jobs')
+    parser_jobs.set_defaults(func=jobs)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())